@@ -0,0 +1,202 @@
+"""
+Batch SSRT estimation of OSARI sessions
+
+Reads the data_txt files (id block trialType trial signal response correct ssd rt),
+or the data/..._trials.npz files where a session has one, and computes for every
+participant (all test mixed blocks together, block 'all') and every test mixed block:
+
+    p(respond|signal), mean SSD and the failed-stop RT
+    go RT distribution (mean, SD, 10th/50th/90th percentile) and go omissions
+    SSRT, integration method with replacement of go omissions by the slowest go RT
+    SSRT, mean method (mean go RT - mean SSD)
+    staircase checks: SSD reversals, SSD slope over the second half of the stop
+        trials, stop trials at the SSD bounds, p(respond|signal) within .25-.75
+        and failed-stop RT faster than go RT (the race model assumption)
+
+Sessions are analysed in parallel and the result of every file is cached (in a
+.cache folder next to it) until the file or the analysis settings change:
+
+    python OSARI_analysis.py data_txt --out ssrt.csv
+"""
+
+from __future__ import absolute_import, division
+import argparse
+import csv
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from OSARI_cache import cacheFolder, fileHash
+from OSARI_logic import defaultMoreTaskInfo, selectDefaults
+from OSARI_store import findSessions, readSession
+
+# increase to invalidate the cached results after changing the analysis
+analysisVersion = 1
+
+# the blocks analysed (test mixed blocks)
+testTrialType = 'testBlocks'
+
+resultColumns = ['file', 'id', 'block', 'nGo', 'nStop', 'pRespond', 'meanSSD', 'failedStopRT',
+                 'goRTMean', 'goRTSD', 'goRTP10', 'goRTMedian', 'goRTP90', 'pOmission',
+                 'ssrtIntegration', 'ssrtMean', 'reversals', 'ssdSlope', 'pAtBound',
+                 'pRespondOK', 'raceViolation']
+
+
+def countReversals(ssd):
+    """Number of changes of direction of the staircase"""
+    steps = np.sign(np.diff(ssd))
+    steps = steps[steps != 0]
+    return int(np.sum(steps[1:] != steps[:-1]))
+
+
+def estimateSSRT(signal, response, ssd, rt, lower_ssd=.05, upper_ssd=.775):
+    """
+    SSRT and staircase checks of one set of trials (arrays in trial order; NaN
+    RT means no lift). Returns a dict with the resultColumns from 'nGo' on.
+    """
+    go = signal == 0
+    stop = signal == 1
+    goRT = rt[go]
+    omissions = np.isnan(goRT)
+    liftedRT = goRT[~omissions]
+    stopSSD = ssd[stop]
+    failed = stop & (response == 1)
+    result = dict.fromkeys(resultColumns[3:], np.nan)
+    result.update(nGo=int(go.sum()), nStop=int(stop.sum()))
+    if go.any():
+        result['pOmission'] = float(omissions.mean())
+    if liftedRT.size:
+        result.update(goRTMean=float(liftedRT.mean()),
+                      goRTSD=float(liftedRT.std(ddof=1)) if liftedRT.size > 1 else np.nan,
+                      goRTP10=float(np.percentile(liftedRT, 10)),
+                      goRTMedian=float(np.median(liftedRT)),
+                      goRTP90=float(np.percentile(liftedRT, 90)))
+    if stop.any():
+        pRespond = float(response[stop].mean())
+        meanSSD = float(np.nanmean(stopSSD))
+        result.update(pRespond=pRespond,
+                      meanSSD=meanSSD,
+                      reversals=countReversals(stopSSD),
+                      pAtBound=float(np.mean((stopSSD <= lower_ssd + 1e-9) | (stopSSD >= upper_ssd - 1e-9))),
+                      pRespondOK=bool(.25 <= pRespond <= .75))
+        if failed.any():
+            result['failedStopRT'] = float(np.nanmean(rt[failed]))
+        secondHalf = stopSSD[len(stopSSD) // 2:]
+        if len(secondHalf) > 1:
+            result['ssdSlope'] = float(np.polyfit(np.arange(len(secondHalf)), secondHalf, 1)[0])
+        if liftedRT.size:
+            # integration method: go omissions are replaced by the slowest go RT
+            allRT = np.sort(np.where(omissions, liftedRT.max(), goRT))
+            nthRT = allRT[max(int(np.ceil(pRespond * len(allRT))) - 1, 0)]
+            result['ssrtIntegration'] = float(nthRT - meanSSD)
+            result['ssrtMean'] = float(liftedRT.mean() - meanSSD)
+            if failed.any():
+                result['raceViolation'] = bool(result['failedStopRT'] > result['goRTMean'])
+    return result
+
+
+def analyseTrials(trials, fileName='', lower_ssd=.05, upper_ssd=.775):
+    """Result rows of one session (structured trial array, see OSARI_store.trialDtype)"""
+    test = trials[trials['trialType'] == testTrialType]
+    participantID = str(trials['id'][0]) if len(trials) else ''
+    rows = []
+    groups = [('all', np.ones(len(test), dtype=bool))]
+    groups += [(int(block), test['block'] == block) for block in np.unique(test['block'])]
+    for block, selected in groups:
+        thisBlock = test[selected]
+        row = {'file': fileName, 'id': participantID, 'block': block}
+        row.update(estimateSSRT(thisBlock['signal'], thisBlock['response'], thisBlock['ssd'],
+                                thisBlock['rt'], lower_ssd, upper_ssd))
+        rows.append(row)
+    return rows
+
+
+def resultCacheFileName(fileName, settings):
+    """Cache file of the results of a session file for the given analysis settings"""
+    digest = hashlib.sha1(f'{fileHash(fileName)}{analysisVersion}{json.dumps(settings, sort_keys=True)}'
+                          .encode()).hexdigest()
+    folder, name = os.path.split(os.path.abspath(fileName))
+    return os.path.join(folder, cacheFolder, f'{name}.{digest}.ssrt.json')
+
+
+def analyseFile(fileName, lower_ssd=.05, upper_ssd=.775, useCache=True):
+    """Result rows of one session file, from the cache if it has been analysed before"""
+    settings = {'lower_ssd': lower_ssd, 'upper_ssd': upper_ssd}
+    cached = resultCacheFileName(fileName, settings)
+    if useCache:
+        try:
+            with open(cached) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    rows = analyseTrials(readSession(fileName), fileName, lower_ssd, upper_ssd)
+    if useCache:
+        try:
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            tmp = f'{cached}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(rows, f)
+            os.replace(tmp, cached)
+        except OSError:
+            pass  # e.g. a read-only data folder
+    return rows
+
+
+def _analyseFile(args):
+    return analyseFile(*args)
+
+
+def analyseFiles(fileNames, lower_ssd=.05, upper_ssd=.775, useCache=True, processes=None):
+    """Result rows of all the session files, analysed in a process pool"""
+    jobs = [(fileName, lower_ssd, upper_ssd, useCache) for fileName in fileNames]
+    rows = []
+    with ProcessPoolExecutor(processes) as pool:
+        for fileRows in pool.map(_analyseFile, jobs, chunksize=16):
+            rows.extend(fileRows)
+    return rows
+
+
+def sessionFiles(paths):
+    """Session files in the given files and folders (see OSARI_store.findSessions)"""
+    files = [path for path in paths if os.path.isfile(path)]
+    found = findSessions([path for path in paths if os.path.isdir(path)])
+    return files + [found[name] for name in sorted(found)]
+
+
+def saveResults(rows, fileName):
+    """Write the result rows to a .csv file"""
+    with open(fileName, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=resultColumns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    defaults = selectDefaults(defaultMoreTaskInfo())[1]
+    parser = argparse.ArgumentParser(description='Estimate the SSRT of OSARI sessions')
+    parser.add_argument('paths', nargs='*', default=['data_txt'],
+                        help='data_txt (or data) folders or session files')
+    parser.add_argument('--out', default='ssrt.csv')
+    parser.add_argument('--lowest-ssd', type=float, default=defaults['Lowest SSD (s)'])
+    parser.add_argument('--highest-ssd', type=float, default=defaults['Highest SSD (s)'])
+    parser.add_argument('--processes', type=int, help='worker processes (default: all cores)')
+    parser.add_argument('--no-cache', action='store_true', help='analyse every file again')
+    args = parser.parse_args(argv)
+
+    fileNames = sessionFiles(args.paths)
+    rows = analyseFiles(fileNames, args.lowest_ssd, args.highest_ssd, not args.no_cache, args.processes)
+    saveResults(rows, args.out)
+    participants = [row for row in rows if row['block'] == 'all']
+    print(f'{len(fileNames)} sessions analysed, saved {args.out}')
+    if participants:
+        ssrt = np.array([row['ssrtIntegration'] for row in participants], dtype=float)
+        print(f'SSRT (integration): mean {np.nanmean(ssrt):.3f} s, SD {np.nanstd(ssrt):.3f} s')
+        print(f'p(respond|signal) outside .25-.75: '
+              f'{sum(row["pRespondOK"] is False for row in participants)} participants')
+        print(f'failed-stop RT slower than go RT: '
+              f'{sum(row["raceViolation"] is True for row in participants)} participants')
+
+
+if __name__ == '__main__':
+    main()
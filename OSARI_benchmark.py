@@ -0,0 +1,396 @@
+"""
+Lift-to-freeze latency benchmark of the OSARI fill loop
+
+Runs fillLoop (OSARI_functions.py) with a scripted keyboard that releases the
+response key at known times, so OSARI's own contribution to the timing error
+can be measured:
+
+    iteration (ms): time spent in one pass of the fill loop (key-buffer drain or sampler read,
+        height computation and bar update), excluding sleeping and waiting for the flip
+    detection (ms): key release to the lift being detected by the loop
+    freeze (ms): key release to the last flip of the fill (the bar stops growing)
+    feedback (ms): key release to the feedback flip
+    kd_start_synced error (ms): recorded minus scripted lift time; the release is
+        scripted against the end of the first flip of the fill (not the keyboard
+        clock reset), so this is the error of the trial clock
+
+By default the window is a stub that flips on a simulated vsync grid (so the
+numbers only reflect OSARI's code); --window pyglet runs the same trials in a
+real window with the task stimuli, which includes the rendering and the driver.
+The stub window needs no display (on Linux without one, pyglet is switched to
+headless mode before PsychoPy's window code is imported).
+--render-load adds a fixed rendering time to every flip of the stub window, and
+--sampler also runs every mode with the keyboard polled by an InputSampler
+(OSARI_input.py), to see how detection depends on the rendering time.
+--predict-flips draws the bar for the predicted flip times (FlipPredictor in
+OSARI_timing.py) and adds flip prediction error (ms): actual minus predicted
+time of every flip of the fill.
+
+Results are saved as JSON (in benchmarks/) so versions can be compared:
+
+    python OSARI_benchmark.py --trials 100 --label v1
+    python OSARI_benchmark.py --trials 100 --compare benchmarks/OSARI_benchmark_v1_<date>.json
+"""
+
+from __future__ import absolute_import, division
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import numpy as np
+import psychopy
+from psychopy import clock, core, data
+from OSARI_input import InputSampler
+from OSARI_timing import FlipPredictor
+
+_thisDir = os.path.dirname(os.path.abspath(__file__))
+
+fillModes = ['frame-locked', 'poll']
+metrics = ['iteration (ms)', 'detection (ms)', 'freeze (ms)', 'feedback (ms)', 'kd_start_synced error (ms)',
+           'flip prediction error (ms)']
+
+
+class ScriptedKey:
+    """A key event as returned by keyboard.Keyboard.getKeys (name, tDown, duration)"""
+    def __init__(self, name, tDown, duration):
+        self.name = name
+        self.value = name
+        self.tDown = tDown
+        self.duration = duration
+
+
+class ScriptedKeyboard:
+    """
+    Stands in for keyboard.Keyboard during the fill loop. The response key is held
+    down from before the trial starts and released lift seconds after the first
+    flip of the trial (see script and startTrial), independently of the clock reset.
+    Every getKeys call of the main thread is timed (see events).
+    """
+    def __init__(self, responseKey='space'):
+        self.responseKey = responseKey
+        self.clock = core.Clock()
+        self.events = []
+        self._lift = None
+        self._tDown = None
+        self.trialStart = None
+        self._cleared = False
+
+    def script(self, lift, hold=.5):
+        ''' Release the key lift seconds after the start of the next trial (the key went down hold seconds ago)'''
+        self._lift = lift
+        self._tDown = clock.getTime() - hold
+        self.trialStart = None
+        self._cleared = False
+        self.events = []
+
+    def startTrial(self, t):
+        ''' A flip ended at t (the first one after script() starts the trial)'''
+        if self.trialStart is None:
+            self.trialStart = t
+
+    def getKeys(self, keyList=None, waitRelease=False, clear=False):
+        now = clock.getTime()
+        if threading.current_thread() is threading.main_thread():
+            self.events.append(('keys', now))
+        if self._cleared or (keyList is not None and self.responseKey not in keyList):
+            return []
+        if self._lift is None or self.trialStart is None:
+            tUp = np.inf
+        else:
+            tUp = self.trialStart + self._lift
+        duration = tUp - self._tDown if now >= tUp else None
+        return [ScriptedKey(self.responseKey, self._tDown, duration)]
+
+    def clearEvents(self):
+        self._cleared = True
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class StubWindow:
+    """
+    Stands in for visual.Window: flip() blocks until the next refresh of a
+    simulated display (a vsync grid with the given frame rate), calls the
+    callOnFlip functions and returns the flip time (core.monotonicClock).
+    renderLoad: seconds spent rendering before each flip (sleeping, as the main
+    thread does whilst waiting for the graphics driver)
+    """
+    def __init__(self, frameRate=60., renderLoad=0.):
+        self.monitorFramePeriod = 1. / frameRate
+        self.renderLoad = renderLoad
+        self._callbacks = []
+        self._t0 = clock.getTime()
+
+    def callOnFlip(self, function, *args, **kwargs):
+        self._callbacks.append((function, args, kwargs))
+
+    def flip(self, clearBuffer=True):
+        if self.renderLoad:
+            time.sleep(self.renderLoad)
+        now = clock.getTime()
+        frames = np.floor((now - self._t0) / self.monitorFramePeriod) + 1
+        core.wait(self._t0 + frames * self.monitorFramePeriod - now, hogCPUperiod=.002)
+        for function, args, kwargs in self._callbacks:
+            function(*args, **kwargs)
+        self._callbacks = []
+        return core.monotonicClock.getTime()
+
+    def close(self):
+        pass
+
+
+class StubBar:
+    """Stands in for FillingBar"""
+    def fill(self, height):
+        return True
+
+    def reset(self):
+        pass
+
+    def setAutoDraw(self, value):
+        pass
+
+
+class FlipRecorder:
+    """
+    Pass every call on to the window, timing the start and end of each flip
+    (onFlip is called with the time every flip ended)
+    """
+    def __init__(self, win, events, onFlip=None):
+        self._win = win
+        self._events = events
+        self._onFlip = onFlip
+
+    def __getattr__(self, name):
+        return getattr(self._win, name)
+
+    def flip(self, *args, **kwargs):
+        self._events.append(('flipStart', clock.getTime()))
+        flipTime = self._win.flip(*args, **kwargs)
+        flipEnd = clock.getTime()
+        self._events.append(('flip', flipEnd))
+        if self._onFlip is not None:
+            self._onFlip(flipEnd)
+        return flipTime
+
+
+class SamplerRecorder:
+    """
+    Pass every call on to an InputSampler, timing each read of its events by the
+    fill loop (the key-buffer drain of a pass when the sampler polls the keyboard)
+    """
+    def __init__(self, sampler, events):
+        self._sampler = sampler
+        self._events = events
+
+    def __getattr__(self, name):
+        return getattr(self._sampler, name)
+
+    def events(self):
+        self._events.append(('keys', clock.getTime()))
+        return self._sampler.events()
+
+
+def iterationTimes(events):
+    """Time from each key-buffer drain (getKeys or sampler read) to the next flip or drain (i.e. the work of one pass)"""
+    times = []
+    for (kind, t), (nextKind, nextT) in zip(events[:-1], events[1:]):
+        if kind == 'keys' and nextKind in ('flipStart', 'keys'):
+            times.append(nextT - t)
+    return times
+
+
+def lastFlipBefore(events, t=np.inf):
+    """Time the last recorded flip before t ended"""
+    flips = [flipT for kind, flipT in events if kind == 'flip' and flipT < t]
+    return flips[-1] if flips else np.nan
+
+
+def makeWindow(kind, frameRate, fullScreen=False, renderLoad=0.):
+    """Return (window, fill bar, stimuli to auto-draw during the fill, feedback stimulus)"""
+    if kind == 'stub':
+        return StubWindow(frameRate, renderLoad), StubBar(), [], None
+    from OSARI_logic import defaultMoreTaskInfo, selectDefaults
+    from OSARI_session import createWindow, TaskStimuli
+    more_task_info = selectDefaults(defaultMoreTaskInfo())
+    more_task_info[1]['Full Screen'] = fullScreen
+    os.chdir(_thisDir)  # stimuli are found relative to the task directory
+    win = createWindow(more_task_info)
+    stim = TaskStimuli(win, more_task_info)
+    stimuli = [stim.targetArrowLeft, stim.targetArrowRight, stim.Bar, stim.fillBar]
+    stim.stimuli.prepare(['correctGo'])
+    return win, stim.fillBar, stimuli, stim.stimuli['correctGo']
+
+
+def runBenchmark(trials=50, modes=fillModes, window='stub', frameRate=60., bar_height=15,
+                 trial_length=1., seed=None, renderLoad=0., sampler=False, predictFlips=False):
+    """
+    Run the scripted trials in each fill loop mode and return the measurements
+    (dictionary of mode: dictionary of metric: list of values in ms). With sampler,
+    every mode is also run with an InputSampler ('<mode> + sampler'). With predictFlips,
+    the bar is drawn for the predicted flip times (see FlipPredictor).
+    """
+    if window == 'stub' and sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+        import pyglet
+        pyglet.options['headless'] = True
+    from OSARI_functions import fillLoop
+    rng = np.random.default_rng(seed)
+    win, fillBar, stimList, feedback = makeWindow(window, frameRate, renderLoad=renderLoad)
+    kb = ScriptedKeyboard()
+    inputSampler = InputSampler(kb, [kb.responseKey, 'escape']) if sampler else None
+    flipPredictor = FlipPredictor(win.monitorFramePeriod) if predictFlips else None
+    runs = [(mode, None) for mode in modes]
+    if sampler:
+        runs += [(f'{mode} + sampler', inputSampler) for mode in modes]
+    results = {}
+    for run, thisSampler in runs:
+        mode = run.split(' + ')[0]
+        results[run] = {metric: [] for metric in metrics}
+        lifts = rng.uniform(.3, .95, trials) * trial_length
+        for lift in lifts:
+            kb.script(lift)
+            fillBar.reset()
+            for thisStim in stimList:
+                thisStim.setAutoDraw(True)
+            recorder = FlipRecorder(win, kb.events, kb.startTrial)
+            samplerRecorder = None if thisSampler is None else SamplerRecorder(thisSampler, kb.events)
+            waiting, lift_time, kd_start_synced = fillLoop(
+                            recorder,
+                            kb,
+                            fillBar,
+                            kb.responseKey,
+                            trial_length,
+                            bar_height,
+                            trial_length,
+                            frameLocked=mode == 'frame-locked',
+                            sampler=samplerRecorder,
+                            flipPredictor=flipPredictor
+                            )
+            released = kb.trialStart + lift
+            freeze = lastFlipBefore(kb.events)
+            if feedback is not None:
+                feedback.setAutoDraw(True)
+            recorder.flip()
+            feedbackFlip = lastFlipBefore(kb.events)
+            measured = results[run]
+            measured['iteration (ms)'].extend(1000 * t for t in iterationTimes(kb.events))
+            if flipPredictor is not None:
+                flips = flipPredictor.takeFlips()
+                measured['flip prediction error (ms)'].extend(1000 * (flips[:, 1] - flips[:, 0]))
+            if waiting == 0:
+                measured['detection (ms)'].append(1000 * (kb.clock.getLastResetTime() + lift_time - released))
+                measured['freeze (ms)'].append(1000 * (freeze - released))
+                measured['feedback (ms)'].append(1000 * (feedbackFlip - released))
+                measured['kd_start_synced error (ms)'].append(1000 * (kd_start_synced - lift))
+            for thisStim in stimList + ([feedback] if feedback is not None else []):
+                thisStim.setAutoDraw(False)
+            win.flip()
+            core.wait(.1)
+    win.close()
+    if inputSampler is not None:
+        inputSampler.close()
+    return results
+
+
+def summarise(values):
+    """Distribution of a list of measurements"""
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        return {'n': 0}
+    return {'n': int(len(values)),
+            'mean': float(values.mean()),
+            'median': float(np.median(values)),
+            'p95': float(np.percentile(values, 95)),
+            'p99': float(np.percentile(values, 99)),
+            'max': float(values.max())}
+
+
+def versionLabel():
+    """Short git commit of the task, if it is a git checkout"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=_thisDir,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def saveResults(results, settings, label, outDir):
+    """Save the summary (and raw measurements) to outDir as JSON and return the file name"""
+    os.makedirs(outDir, exist_ok=True)
+    fileName = os.path.join(outDir, f'OSARI_benchmark_{label}_{data.getDateStr()}.json')
+    output = {'label': label,
+              'date': data.getDateStr(),
+              'platform': platform.platform(),
+              'python': platform.python_version(),
+              'psychopy': psychopy.__version__,
+              'settings': settings,
+              'summary': {mode: {metric: summarise(values) for metric, values in measured.items()}
+                          for mode, measured in results.items()},
+              'raw': results}
+    with open(fileName, 'w') as f:
+        json.dump(output, f, indent=1)
+    return fileName
+
+
+def report(summary, previous=None):
+    """Table of the median and p95 of each metric (and the change since a previous run)"""
+    lines = []
+    for mode, measured in summary.items():
+        lines.append(f'{mode}:')
+        for metric, stats in measured.items():
+            if not stats['n']:
+                continue
+            line = f'    {metric:<28} median {stats["median"]:7.3f}  p95 {stats["p95"]:7.3f}  max {stats["max"]:7.3f}'
+            before = (previous or {}).get(mode, {}).get(metric, {})
+            if before.get('n'):
+                line += (f'   (median {stats["median"] - before["median"]:+.3f},'
+                         f' p95 {stats["p95"] - before["p95"]:+.3f})')
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the lift-to-freeze latency of the OSARI fill loop')
+    parser.add_argument('--trials', type=int, default=50, help='trials per fill loop mode')
+    parser.add_argument('--mode', choices=fillModes, action='append',
+                        help='fill loop mode (default: all)')
+    parser.add_argument('--window', choices=['stub', 'pyglet'], default='stub')
+    parser.add_argument('--frame-rate', type=float, default=60., help='refresh rate of the stub window')
+    parser.add_argument('--render-load', type=float, default=0.,
+                        help='rendering time of every flip of the stub window (ms)')
+    parser.add_argument('--sampler', action='store_true',
+                        help='also run every mode with the keyboard polled by an InputSampler')
+    parser.add_argument('--predict-flips', action='store_true',
+                        help='draw the bar for the predicted flip times and measure the prediction error')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--label', help='name of this run (default: the git commit)')
+    parser.add_argument('--out', default=os.path.join(_thisDir, 'benchmarks'))
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args(argv)
+
+    settings = {'trials': args.trials, 'window': args.window, 'frameRate': args.frame_rate,
+                'seed': args.seed, 'renderLoad': args.render_load, 'sampler': args.sampler,
+                'predictFlips': args.predict_flips}
+    results = runBenchmark(args.trials, args.mode or fillModes, args.window, args.frame_rate,
+                           seed=args.seed, renderLoad=args.render_load / 1000, sampler=args.sampler,
+                           predictFlips=args.predict_flips)
+    fileName = saveResults(results, settings, args.label or versionLabel(), args.out)
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)['summary']
+    with open(fileName) as f:
+        print(report(json.load(f)['summary'], previous))
+    print(f'saved {fileName}')
+
+
+if __name__ == '__main__':
+    main()
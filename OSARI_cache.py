@@ -0,0 +1,86 @@
+"""
+Compiled cache of the condition and instruction spreadsheets
+
+data.importConditions parses the .xlsx files with openpyxl/pandas, which is a
+noticeable part of OSARI's start up time. importConditions below keeps the
+parsed trial list in a pickle next to the spreadsheet (in a .cache folder),
+keyed by a hash of the spreadsheet's content, so a spreadsheet is only parsed
+again after it has been changed.
+
+To pre-warm the cache for a whole study directory run:
+
+    python OSARI_cache.py conditionFiles
+"""
+
+from __future__ import absolute_import, division
+import argparse
+import glob
+import hashlib
+import os
+import pickle
+
+cacheFolder = '.cache'
+spreadsheetTypes = ('.xlsx', '.xls', '.csv')
+
+
+def fileHash(fileName):
+    """sha1 of the content of a file"""
+    with open(fileName, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def cacheFileName(fileName, digest):
+    """Cache file of a spreadsheet with the given content hash"""
+    folder, name = os.path.split(os.path.abspath(fileName))
+    return os.path.join(folder, cacheFolder, f'{name}.{digest}.pickle')
+
+
+def importConditions(fileName):
+    """
+    Return the trial list of a spreadsheet (as data.importConditions), from the
+    cache if the spreadsheet has not changed since it was last parsed
+    """
+    digest = fileHash(fileName)
+    cached = cacheFileName(fileName, digest)
+    try:
+        with open(cached, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+    from psychopy import data
+    conditions = data.importConditions(fileName)
+    try:
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        # remove out-of-date versions of this spreadsheet
+        for old in glob.glob(cacheFileName(fileName, '*')):
+            os.remove(old)
+        tmp = f'{cached}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(conditions, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cached)  # so other processes never read a half-written cache
+    except OSError:
+        pass  # e.g. a read-only study directory: just do without the cache
+    return conditions
+
+
+def warmCache(studyDir):
+    """Parse (if needed) every spreadsheet in a study directory and its subfolders"""
+    warmed = []
+    for folder, dirs, files in os.walk(studyDir):
+        dirs[:] = [d for d in dirs if d != cacheFolder]
+        for name in sorted(files):
+            # skip the lock files Excel leaves behind (~$name.xlsx)
+            if name.lower().endswith(spreadsheetTypes) and not name.startswith('~$'):
+                fileName = os.path.join(folder, name)
+                importConditions(fileName)
+                warmed.append(fileName)
+    return warmed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pre-warm the OSARI spreadsheet cache')
+    parser.add_argument('studyDirs', nargs='*', default=['conditionFiles'])
+    args = parser.parse_args()
+    for studyDir in args.studyDirs:
+        for fileName in warmCache(studyDir):
+            print(f'cached {fileName}')
@@ -0,0 +1,157 @@
+"""
+Crash-safe checkpoint of a session, and resuming an interrupted session
+
+The ExperimentHandler only writes the .csv when the session ends. So that an
+interrupted session (a crash, the window closing, the machine going to sleep)
+does not have to be repeated, every trial is also appended to a checkpoint file
+(data/ID_OSARI_date_checkpoint.jsonl, one JSON object per line, written by a
+background thread and flushed to disk in the inter-trial interval, see sync):
+
+    {"type": "session", ...}   the participant information, parameters and seed
+    {"type": "trial", ...}     position in the session, SSD, data_txt and .csv values
+    {"type": "resume", ...}    the session was resumed from this trial
+    {"type": "end"}            the session finished
+    {"type": "aborted"}        the participant chose to end the session
+
+Because the trial order and jitters come from the session seed (see
+OSARI_schedule.py), a session can be resumed at the exact trial it stopped:
+the recorded trials are restored (written to the output files and replayed
+through the SSD method, so the staircase continues from the same state) and
+the session carries on with the first trial that was not completed.
+OSARI.py offers to resume when it finds an unfinished session of the participant
+(one that was interrupted, rather than finished or aborted).
+"""
+
+from __future__ import absolute_import, division
+import json
+import os
+from OSARI_writer import TrialWriter
+
+checkpointSuffix = '_checkpoint.jsonl'
+checkpointVersion = 1
+
+
+def _toJSON(value):
+    """JSON value of numpy scalars and arrays"""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+class Checkpoint:
+    """
+    Append-only checkpoint of a session (see above). Lines are queued and written
+    by a background thread (see TrialWriter in OSARI_writer.py); sync() waits until
+    they are flushed and fsynced, so call it in the ITI before the next trial starts.
+    """
+    def __init__(self, fileName, expInfo=None, more_task_info=None, seed=None, nTrials=None, resumeFrom=None):
+        self.fileName = fileName
+        if resumeFrom is None:
+            open(fileName, 'w').close()
+        else:
+            with open(fileName, 'r+') as f:
+                # drop a partly written last line (e.g. after a crash) before appending
+                content = f.read()
+                f.seek(content.rfind('\n') + 1)
+                f.truncate()
+        self._writer = TrialWriter(fileName, header=None)
+        if resumeFrom is None:
+            self._add({'type': 'session', 'version': checkpointVersion, 'expInfo': expInfo,
+                       'more_task_info': more_task_info, 'seed': seed, 'nTrials': nTrials})
+        else:
+            self._add({'type': 'resume', 'trial': resumeFrom})
+        self.sync()
+        self._closed = False
+
+    def _add(self, entry):
+        self._writer.writeLine(json.dumps(entry, default=_toJSON) + '\n')
+
+    def sync(self):
+        ''' Wait until the lines added so far are on disk (flushed and fsynced)'''
+        self._writer.flush()
+
+    def addTrial(self, trial, blockIndex, rep, trialN, stoptime, values, row):
+        ''' Record a completed trial
+        input:
+            trial: trial number in the session (row of the schedule)
+            blockIndex, rep, trialN: position in the blocks
+            stoptime: the SSD of the trial (before go trials set it to 'NaN')
+            values: the data_txt values (see dataTxtHeader)
+            row: the values added to the .csv row'''
+        self._add({'type': 'trial', 'trial': trial, 'blockIndex': blockIndex, 'rep': rep,
+                   'trialN': trialN, 'stoptime': stoptime, 'values': list(values), 'row': row})
+
+    def close(self, finished=True):
+        ''' Close the checkpoint (finished: the session ran to the end)'''
+        if self._closed:
+            return
+        self._closed = True
+        if finished:
+            self._add({'type': 'end'})
+        self._writer.close()
+
+    def abort(self):
+        ''' Close the checkpoint of a session the participant chose to end, so it is not resumed'''
+        if self._closed:
+            return
+        self._add({'type': 'aborted'})
+        self.close(finished=False)
+
+
+def readCheckpoint(fileName):
+    """
+    Return (session entry, completed trial entries in order, finished) of a checkpoint
+    (finished: the session ran to the end or was aborted, so it cannot be resumed).
+    A partly written last line (e.g. after a crash) is ignored.
+    """
+    session = None
+    trials = []
+    finished = False
+    with open(fileName) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a partly written line
+            if entry['type'] == 'session':
+                session = entry
+            elif entry['type'] == 'resume':
+                del trials[entry['trial']:]  # trials recorded after the resume point are run again
+            elif entry['type'] == 'trial':
+                trials.append(entry)
+            elif entry['type'] in ('end', 'aborted'):
+                finished = True
+    if session is None:
+        raise ValueError(f'{fileName} is not an OSARI checkpoint')
+    return session, trials, finished
+
+
+def findCheckpoint(dataDir, participantID):
+    """The checkpoint of the latest unfinished session of a participant (None if there is none)"""
+    try:
+        names = os.listdir(dataDir)
+    except OSError:
+        return None
+    prefix = f'{participantID}_'
+    found = []
+    for name in names:
+        if name.startswith(prefix) and name.endswith(checkpointSuffix):
+            fileName = os.path.join(dataDir, name)
+            try:
+                session, trials, finished = readCheckpoint(fileName)
+            except (OSError, ValueError):
+                continue
+            if not finished and session['expInfo']['Participant ID'] == participantID:
+                found.append((os.path.getmtime(fileName), fileName))
+    return max(found)[1] if found else None
+
+
+def setAsideOutputs(stem, extensions=('.csv', '.psydat')):
+    """
+    Rename the files an interrupted session may have written when Python exited
+    (e.g. stem.csv to stem_interrupted.csv), so the resumed session can write the
+    complete files under the same names
+    """
+    for extension in extensions:
+        if os.path.exists(stem + extension):
+            os.replace(stem + extension, f'{stem}_interrupted{extension}')
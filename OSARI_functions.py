@@ -2,11 +2,18 @@
 #These are internal functions used by the main OSARI.py code
 from psychopy import event, core
 from psychopy.visual.shape import ShapeStim
+from psychopy.tools.monitorunittools import cm2pix
+import numpy as np
+from OSARI_logic import setHeight
+from OSARI_input import keyRelease
 
 
 class FillingBar(ShapeStim):
     """
     Extend the class ShapeStim to make a bar that fills
+    The vertices are kept in a preallocated array that is updated in place, and
+    new vertices are only given to the ShapeStim when the top of the bar moves
+    to a new pixel row of the window.
     """
     def __init__(self, win, vert):
         ''' Initialize FillingBar object'''
@@ -17,21 +24,29 @@ class FillingBar(ShapeStim):
                                   opacity=1,
                                   units='cm',
                                   vertices=vert)
+        self.startVert = np.array(vert, dtype=float)  # vertices at the starting height
+        self.vertBuffer = self.startVert.copy()
+        self.pixPerCm = cm2pix(1., win.monitor)
+        self.topPix = 0  # pixel row of the top of the bar (relative to its start)
 
-    def fill(self, vert, height):
-        ''' Reset the height of the FillingBar object
+    def fill(self, height):
+        ''' Set the height of the FillingBar object
         input:
-        vert: set of vertices
-        height: new height of upper vertices'''
-        vert[1] = (vert[1][0], vert[1][1] + height)  # left corner
-        vert[2] = (vert[2][0], vert[2][1] + height)  # right corner
-        self.vertices = vert
+        height: height of upper vertices above their starting height
+        returns True if the bar moved to a new pixel row (i.e. new vertices were set)'''
+        topPix = int(round(height * self.pixPerCm))
+        if topPix == self.topPix:
+            return False
+        self.topPix = topPix
+        self.vertBuffer[1:3, 1] = self.startVert[1:3, 1] + height  # left and right upper corners
+        self.vertices = self.vertBuffer
+        return True
 
-    def resetVert(self, vert, height):
+    def reset(self):
         ''' Reset vertices of the filling bar to their starting height'''
-        vert[1] = (vert[1][0], vert[1][1] - height)  # left corner
-        vert[2] = (vert[2][0], vert[2][1] - height)  # right corner
-        return vert
+        self.topPix = 0
+        self.vertBuffer[:] = self.startVert
+        self.vertices = self.vertBuffer
 
 def keyWatch(thisExp, keyList=None):
     """
@@ -45,78 +60,147 @@ def keyWatch(thisExp, keyList=None):
         thisExp.close()
         core.quit()
 
-def countdown():
-    """ Count down the start of the trial and warn if key is lifted too soon"""
-    countdownTime = core.CountdownTimer(3)
-    while countdownTime.getTime() > 0:
-        remainingKeys = kb.getKeys(keyList=[more_task_info[1]['Response key'], 'escape'], waitRelease=False, clear=False)
-        number_text.text = f'{int(countdownTime.getTime())}'
-        if remainingKeys:
-            for key in remainingKeys:
-                if key.duration:
-                    kb.clearEvents()  # clear the key events
-                    kb.clock.reset()  # reset the keyboard clock
-                    instructionsText['tooSoon'].draw()  # early lift warning
-                    win.flip()
-                    k = event.waitKeys()  # wait for keypress
-                    if k[0] == 'escape':  # allow escape during countdown
-                        print('User pressed escape, quiting now')
-                        win.close()
-                        core.quit()
-                    countdownTime.reset()  # reset the countdown clock
-        Bar.draw()
-        fillBar.draw()
-        targetArrowRight.draw()
-        targetArrowLeft.draw()
-        if countdownTime.getTime() > 0:
-            number_text.draw()
-        win.flip()
+def _flipTime(flipTime, flipPredictor=None):
+    """
+    Time of a flip (now, if win.flip() did not wait for the blank), which is passed
+    on to the flip predictor
+    """
+    if flipTime is None:
+        flipTime = core.monotonicClock.getTime()
+    if flipPredictor is not None:
+        flipPredictor.addFlip(flipTime)
+    return flipTime
 
-def calculateStopTime(correct, stoptime, lower_ssd, upper_ssd, stepsize):
+def _drainKeys(kb, keyList, sampler=None):
     """
-    Calculate stoptime for next trial based on:
-        correct (int):
-            0 = incorrect stop OR
-            2 = correct stop
-        stoptime (float):
-            stoptime on previous trial
-        lower_ssd (float):
-            lowest possible ssd selected by the user in the Additional Parameters Dialog 
-        upper_ssd (float)
-            highest possible ssd selected by the user in the Additional Parameters Dialog 
+    Key records (name, tDown, duration, seenAt) of the keys in keyList: every key since
+    the keyboard's last clearEvents, or the key events the sampler wrote since the last
+    call. duration is None until the key is released; seenAt is the time the key was
+    seen (the sampler's sample time, or now when polling), on the clock of tDown.
     """
-    if  correct == 2 and stoptime < upper_ssd:
-        stoptime = stoptime + stepsize
-    elif correct == 2 and stoptime == upper_ssd:
-        stoptime = upper_ssd
-    elif correct == 0 and stoptime > lower_ssd: 
-        stoptime = stoptime - stepsize
-    elif correct == 0 and stoptime == lower_ssd:
-        stoptime = lower_ssd
-    return stoptime
+    if sampler is None:
+        keys = kb.getKeys(keyList=keyList, waitRelease=False, clear=False)
+        seenAt = kb.clock.getLastResetTime() + kb.clock.getTime()
+        return [(key.name, key.tDown, key.duration or None, seenAt) for key in keys]
+    return [(keyEvent['key'].decode(), float(keyEvent['tDown']),
+             float(keyEvent['duration']) if keyEvent['kind'] == keyRelease else None,
+             float(keyEvent['sampled']))
+            for keyEvent in sampler.events()]
 
-def setHeight(time_elapsed, this_stoptime, bar_height, trial_length):
+def fillLoop(win, kb, fillBar, responseKey, this_stoptime, bar_height, trial_length,
+             frameLocked=True, renderBudget=.004, keyLog=None, sampler=None, flipPredictor=None):
     """
-    Calculate "height" - the current height of the bar in cm
-    this will be added to the vertices position to adjust the size of
-    the filling (blue) bar.
+    Start the trial (reset the keyboard clock on the first flip) and fill the bar
+    until the key is lifted or the trial length is reached.
+    input:
+        frameLocked: if True, do exactly one key-buffer drain, one height computation
+            and one flip per refresh, and sleep for the rest of each frame (waking up
+            renderBudget seconds before the next flip is due). If False, poll the
+            keyboard as fast as possible and flip on every pass once the key is down.
+        keyLog: if given, the clock reset and the raw key events of the trial are
+            added to this KeyEventLog (see OSARI_keylog.py)
+        sampler: if given, the keyboard is polled by this InputSampler (see OSARI_input.py)
+            during the fill and the loop reads its events instead of calling kb.getKeys
+            (see _drainKeys); either way the lift is detected at the time the release
+            was first seen
+        flipPredictor: if given, the bar is drawn at its height for the predicted time of
+            the flip that shows it (see FlipPredictor in OSARI_timing.py), rather than for
+            the time the height is computed; the predicted and actual flip times are kept
+            by the predictor
+    returns (waiting, lift_time, kd_start_synced)
+        waiting: 1 if the key was not lifted before the end of the trial
+        lift_time: time the lift was detected (keyboard clock)
+        kd_start_synced: key lift time relative to the start of the trial
     """
-    if time_elapsed < this_stoptime:
-        height = (time_elapsed * bar_height) / trial_length
-    elif time_elapsed >= this_stoptime:
-        height = (this_stoptime * bar_height) / trial_length  # max_height
-    return height
+    waiting = 1
+    lift_time = 'NaN'
+    kd_start_synced = 'NaN'
+    time_elapsed = 0
+    framePeriod = win.monitorFramePeriod
+    win.callOnFlip(kb.clock.reset)
+    lastFlip = win.flip()
+    if sampler is not None:
+        sampler.start()
+    if flipPredictor is not None:
+        flipPredictor.start(core.monotonicClock.getTime() if lastFlip is None else lastFlip)
+    seenKeys = {}  # (name, tDown): [name, tDown, duration]
+    detectedKey = None
+    if keyLog is not None:
+        keyLog.addReset(kb.clock.getLastResetTime())
+    while time_elapsed < trial_length and waiting == 1:
+        if frameLocked and lastFlip is not None:
+            # give the rest of this frame back to the OS
+            sleepTime = lastFlip + framePeriod - renderBudget - core.monotonicClock.getTime()
+            if sleepTime > 0:
+                core.wait(sleepTime, hogCPUperiod=0)
+        # Watch the keyboard for a response: the lift is detected at the time the release was seen
+        for name, tDown, duration, seenAt in _drainKeys(kb, [responseKey, 'escape'], sampler):
+            seenKeys[(name, tDown)] = [name, tDown, duration]
+            if duration and waiting == 1:
+                lift_time = seenAt - kb.clock.getLastResetTime()
+                kd_start_synced = duration - abs(
+                                (tDown - kb.clock.getLastResetTime())
+                                )
+                waiting = 0
+                detectedKey = (name, tDown)
+        # Record how much time has elapsed since the start of the trial
+        time_elapsed = kb.clock.getTime()
+        drawTime = time_elapsed
+        if flipPredictor is not None:
+            now = core.monotonicClock.getTime()
+            drawTime += flipPredictor.predict(now) - now
+        height = setHeight(
+                        drawTime,
+                        this_stoptime,
+                        bar_height,
+                        trial_length
+                        )
+        # Frame-locked: flip every refresh. Otherwise flip as soon as the key is down.
+        if frameLocked or seenKeys:
+            # Set the vertices of the filling bar (only updated if the top moves a pixel)
+            fillBar.fill(height)
+            lastFlip = _flipTime(win.flip(), flipPredictor)
+    if sampler is not None:
+        sampler.stop()
+    if waiting == 0:
+        kb.clearEvents()  # clear the key events
+    if keyLog is not None:
+        for name, tDown, duration in seenKeys.values():
+            keyLog.addKey(name, tDown, duration, lift_time if (name, tDown) == detectedKey else None)
+    return waiting, lift_time, kd_start_synced
 
-def setTargetCol(kd_start_synced, Target_time, palette):
+class Countdown:
     """
-    set color of the target triangles based on distance
+    Count down the start of the trial over the bar, and warn if the key is lifted too soon.
+    The digits are laid out once (see StimulusRegistry.text in OSARI_stimuli.py), and
+    every frame the keyboard is checked once and the bar and the current digit are
+    drawn and flipped; the digit stimulus is only swapped when the number changes.
     """
-    if abs(kd_start_synced - Target_time) < .02:
-        fillCol = palette[0]
-    elif .04 > abs(kd_start_synced - Target_time) >= .02:
-        fillCol= palette[1]
-    elif .06 > abs(kd_start_synced - Target_time) >= .04:
-        fillCol = palette[2]
-    else:
-        fillCol = palette[3]
-    return fillCol
+    def __init__(self, win, stimuli, background, responseKey, pos, seconds=3, color=(-1, -1, -1)):
+        self.win = win
+        self.stimuli = stimuli
+        self.background = background  # stimuli drawn under the digits (bar and target arrows)
+        self.responseKey = responseKey
+        self.seconds = seconds
+        self.digits = {n: stimuli.text(f'{n}', pos=pos, color=color) for n in range(1, seconds + 1)}
+
+    def run(self, kb, thisExp):
+        ''' Count down (kb: the keyboard watching the held response key)'''
+        countdownTime = core.CountdownTimer(self.seconds)
+        while countdownTime.getTime() > 0:
+            remainingKeys = kb.getKeys(keyList=[self.responseKey, 'escape'], waitRelease=False, clear=False)
+            for key in remainingKeys:
+                if key.duration:
+                    kb.clearEvents()  # clear the key events
+                    kb.clock.reset()  # reset the keyboard clock
+                    self.stimuli['tooSoon'].draw()  # early lift warning
+                    self.win.flip()
+                    keyWatch(thisExp=thisExp)  # wait for keypress (escape quits)
+                    countdownTime.reset()  # reset the countdown clock
+                    break
+            for thisStim in self.background:
+                thisStim.draw()
+            remaining = countdownTime.getTime()
+            if remaining > 0:
+                self.digits[min(int(np.ceil(remaining)), self.seconds)].draw()
+            self.win.flip()
@@ -0,0 +1,172 @@
+"""
+High-rate input sampling for the fill loop
+
+Without it, a key lift is only noticed when the fill loop gets round to calling
+kb.getKeys, which happens between drawing and flipping. InputSampler polls the
+keyboard on its own thread at a fixed rate (1000 Hz by default) and writes every
+key press and release, with the time it was sampled, to an EventRing: a ring
+buffer of fixed-size records in shared memory with a single writer, which the
+fill loop reads without locking or blocking. The time a lift is detected then
+depends on the sampling rate rather than on how long a frame takes to render.
+
+A psychopy.hardware.keyboard.Keyboard can only be sampled with the psychtoolbox
+backend: the 'event' backend pumps the window's events in getKeys, which is not
+safe from another thread (on macOS) or sees no events (on Windows), so runSession
+does not use the sampler with it. Any other object with the getKeys(keyList,
+waitRelease, clear) method of Keyboard can be sampled, e.g. the ScriptedKeyboard of
+OSARI_benchmark.py (python OSARI_benchmark.py --sampler compares the fill loop
+with and without the sampler). The ring can also be attached to by name from
+another process, e.g. to feed it from a response box.
+"""
+
+from __future__ import absolute_import, division
+import sys
+import threading
+import time
+import numpy as np
+from multiprocessing import shared_memory
+from psychopy import clock
+
+# event kinds
+keyPress = 1
+keyRelease = 2
+
+inputEventDtype = np.dtype([
+                ('kind', 'u1'),
+                ('key', 'S11'),
+                ('t', '<f8'),  # time of the press (tDown) or release (tDown + duration)
+                ('tDown', '<f8'),
+                ('duration', '<f8'),  # NaN for a press
+                ('sampled', '<f8')  # time the sampler saw the event (psychopy.clock.getTime)
+                ])
+
+
+class EventRing:
+    """
+    Single-writer ring buffer of input events (see inputEventDtype) in shared memory.
+    The writer fills a record and then advances the write count, so a reader
+    that only reads records below the count never sees a half-written record.
+    Readers keep their own position (see read), so they never block the writer.
+    """
+    def __init__(self, capacity=1024, name=None):
+        size = 8 + capacity * inputEventDtype.itemsize
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            self._owner = True
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            self._owner = False
+            capacity = (self._shm.size - 8) // inputEventDtype.itemsize
+        self.capacity = capacity
+        self.name = self._shm.name
+        self._count = np.ndarray(1, dtype='<i8', buffer=self._shm.buf)  # events written so far
+        self._events = np.ndarray(capacity, dtype=inputEventDtype, buffer=self._shm.buf, offset=8)
+        if self._owner:
+            self._count[0] = 0
+
+    @classmethod
+    def attach(cls, name):
+        ''' The ring created (e.g. in another process) under this name'''
+        return cls(name=name)
+
+    @property
+    def count(self):
+        return int(self._count[0])
+
+    def write(self, kind, key, t, tDown, duration, sampled):
+        ''' Add an event (only one thread or process may write)'''
+        n = int(self._count[0])
+        self._events[n % self.capacity] = (kind, key, t, tDown, duration, sampled)
+        self._count[0] = n + 1
+
+    def read(self, since):
+        ''' Return (events written since the count since, the count to read from next time,
+        number of events lost because they were overwritten before being read)'''
+        n = int(self._count[0])
+        lost = max(n - since - self.capacity, 0)
+        start = since + lost
+        slots = np.arange(start, n) % self.capacity
+        events = self._events[slots]  # a copy
+        # events overwritten whilst they were being copied are dropped
+        overwritten = max(int(self._count[0]) - start - self.capacity, 0)
+        return events[overwritten:], n, lost + overwritten
+
+    def close(self):
+        self._count = self._events = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+class InputSampler:
+    """
+    Poll a keyboard on a background thread at a fixed rate and write its key presses
+    and releases to an EventRing. The trial loop calls events() to get the events
+    written since its last call. While the sampler runs, no other thread may call
+    the keyboard's getKeys or clearEvents.
+    """
+    def __init__(self, kb, keyList, rate=1000., ring=None, switchInterval=.0005):
+        self.kb = kb
+        self.keyList = keyList
+        self.period = 1. / rate
+        self.ring = EventRing() if ring is None else ring
+        # a shorter interpreter switch interval so the sampler thread gets the GIL promptly
+        self.switchInterval = switchInterval
+        self.lost = 0
+        self._read = self.ring.count
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        ''' Start sampling (the events written before are skipped)'''
+        if self._thread is not None:
+            return
+        self._read = self.ring.count
+        self._stop.clear()
+        self._oldSwitchInterval = sys.getswitchinterval()
+        if self.switchInterval:
+            sys.setswitchinterval(self.switchInterval)
+        self._thread = threading.Thread(target=self._run, name='InputSampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        ''' Stop sampling (waits for the sampler thread to finish)'''
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        sys.setswitchinterval(self._oldSwitchInterval)
+
+    def events(self):
+        ''' The events written since the last call (structured array, see inputEventDtype)'''
+        events, self._read, lost = self.ring.read(self._read)
+        self.lost += lost
+        return events
+
+    def close(self):
+        self.stop()
+        self.ring.close()
+
+    def _run(self):
+        ring = self.ring
+        pressed = set()
+        released = set()
+        nextSample = clock.getTime()
+        while not self._stop.is_set():
+            keys = self.kb.getKeys(keyList=self.keyList, waitRelease=False, clear=False)
+            sampled = clock.getTime()
+            for key in keys:
+                name = key.name.encode()[:11]
+                if (name, key.tDown) not in pressed:
+                    pressed.add((name, key.tDown))
+                    ring.write(keyPress, name, key.tDown, key.tDown, np.nan, sampled)
+                if key.duration and (name, key.tDown) not in released:
+                    released.add((name, key.tDown))
+                    ring.write(keyRelease, name, key.tDown + key.duration, key.tDown, key.duration, sampled)
+            nextSample += self.period
+            sleepTime = nextSample - clock.getTime()
+            if sleepTime > 0:
+                time.sleep(sleepTime)
+            else:
+                nextSample = clock.getTime()  # fell behind: do not try to catch up
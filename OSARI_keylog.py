@@ -0,0 +1,226 @@
+"""
+Raw key-event log and re-scoring of archived sessions
+
+During the fill of every trial the keyboard clock reset and the raw key events
+(key, tDown, duration and the time the lift was detected) are recorded in a
+binary log (data/ID_OSARI_date_keys.bin, fixed-size records, see keyEventDtype).
+Trials are numbered in session order, i.e. trial n of the log is row n of the
+data_txt file and of the _trials.npz file.
+
+rescoreStudy replays the scoring (lift time, feedback and target colour bands,
+see scoreTrialBatch in OSARI_logic.py) for all sessions of a study at once, so a
+fix to the scoring can be applied to sessions that have already been collected:
+
+    python OSARI_keylog.py data --out rescored.npz
+"""
+
+from __future__ import absolute_import, division
+import argparse
+import atexit
+import os
+import numpy as np
+from OSARI_logic import scoreTrialBatch, feedbackLabels
+from OSARI_store import storeSuffix
+
+keyLogSuffix = '_keys.bin'
+keyLogHeader = b'OSARI keylog 1\n\0'  # 16 bytes
+
+# record kinds
+clockReset = 0
+keyEvent = 1
+
+keyEventDtype = np.dtype([
+                ('trial', '<i4'),
+                ('kind', 'u1'),
+                ('key', 'S11'),
+                ('t', '<f8'),  # clock reset: reset time; key event: tDown
+                ('duration', '<f8'),  # NaN if the key was not released
+                ('detected', '<f8')  # time the lift was detected (keyboard clock), NaN if not detected
+                ])
+
+rescoredDtype = np.dtype([
+                ('session', 'i4'),
+                ('trial', 'i4'),
+                ('signal', 'i1'),
+                ('ssd', 'f8'),
+                ('response', 'i1'),
+                ('rt', 'f8'),
+                ('correct', 'i1'),
+                ('feedback', 'i1'),
+                ('targetColour', 'i1'),
+                ('recordedRT', 'f8'),
+                ('recordedCorrect', 'i1'),
+                ('changed', '?')
+                ])
+
+
+class KeyEventLog:
+    """
+    Binary log of the raw keyboard events of a session. The fill loop adds the
+    clock reset and key events of the trial (see fillLoop). endTrial() (call it
+    after the trial has been scored) only keeps them in memory; they are written
+    to file by flush() (call it in the inter-trial interval) and by close().
+    """
+    def __init__(self, fileName, startTrial=0):
+        self.fileName = fileName
+        self.trial = startTrial
+        self._records = []
+        self._pending = []  # records of the ended trials that have not been written yet
+        # a resumed session (see OSARI_checkpoint.py) keeps the events of the trials before startTrial
+        kept = None
+        if startTrial and os.path.exists(fileName):
+            kept = readKeyLog(fileName)
+            kept = kept[kept['trial'] < startTrial]
+        self._file = open(fileName, 'wb')
+        self._file.write(keyLogHeader)
+        if kept is not None:
+            kept.tofile(self._file)
+        atexit.register(self.close)
+
+    def addReset(self, t):
+        ''' The keyboard clock was reset at t (the start of the trial)'''
+        self._records.append((self.trial, clockReset, b'', t, np.nan, np.nan))
+
+    def addKey(self, key, tDown, duration=None, detected=None):
+        ''' A key event of this trial (duration None if not released, detected None if not detected)'''
+        self._records.append((self.trial, keyEvent, key.encode()[:11], tDown,
+                              np.nan if duration is None else duration,
+                              np.nan if detected is None else detected))
+
+    def endTrial(self):
+        ''' End the trial (its events are written by the next flush) and start the next trial'''
+        self._pending.extend(self._records)
+        self._records = []
+        self.trial += 1
+
+    def flush(self):
+        ''' Write the events of the ended trials'''
+        if self._pending and not self._file.closed:
+            np.array(self._pending, dtype=keyEventDtype).tofile(self._file)
+            self._file.flush()
+        self._pending = []
+
+    def close(self):
+        atexit.unregister(self.close)
+        if not self._file.closed:
+            if self._records:
+                self.endTrial()
+            self.flush()
+            self._file.close()
+
+
+def readKeyLog(fileName):
+    """Records of a key-event log (structured array, see keyEventDtype)"""
+    with open(fileName, 'rb') as f:
+        if f.read(len(keyLogHeader)) != keyLogHeader:
+            raise ValueError(f'{fileName} is not an OSARI key-event log')
+        raw = f.read()
+    # ignore a partly written record at the end (e.g. after a crash)
+    return np.frombuffer(raw[:len(raw) - len(raw) % keyEventDtype.itemsize], dtype=keyEventDtype)
+
+
+def replayTrials(nTrials, records, trial_length=1.):
+    """
+    Re-derive (lifted, RT, kd_start_synced) of nTrials trials from their key
+    events (arrays, NaN if the key was not lifted). A trial was lifted if a key
+    was released (tDown + duration) within trial_length of the clock reset,
+    whether or not the fill loop detected it; RT is the time the lift was
+    detected, or the release time if it was not detected.
+    records may hold several sessions if their trial numbers have been offset.
+    """
+    resets = records[records['kind'] == clockReset]
+    resetTime = np.full(nTrials, np.nan)
+    resetTime[resets['trial']] = resets['t']
+    keys = records[(records['kind'] == keyEvent) & (records['key'] != b'escape')
+                   & np.isfinite(records['duration'])]
+    released = keys['t'] + keys['duration'] - resetTime[keys['trial']]
+    keys = keys[released < trial_length]
+    released = released[released < trial_length]
+    # the first release of each trial
+    order = np.lexsort((released, keys['trial']))
+    trial, first = np.unique(keys['trial'][order], return_index=True)
+    lift = keys[order][first]
+    lifted = np.zeros(nTrials, dtype=np.int8)
+    RT = np.full(nTrials, np.nan)
+    kd_start_synced = np.full(nTrials, np.nan)
+    lifted[trial] = 1
+    RT[trial] = np.where(np.isfinite(lift['detected']), lift['detected'], released[order][first])
+    kd_start_synced[trial] = lift['duration'] - np.abs(lift['t'] - resetTime[trial])
+    return lifted, RT, kd_start_synced
+
+
+def findKeyLogs(dataDirs):
+    """Return {session name: (key log, _trials.npz file)} of the sessions that have both"""
+    found = {}
+    for dataDir in dataDirs:
+        for folder, dirs, files in os.walk(dataDir):
+            for name in files:
+                if name.endswith(keyLogSuffix):
+                    stem = name[:-len(keyLogSuffix)]
+                    trialsFile = os.path.join(folder, stem + storeSuffix)
+                    if os.path.exists(trialsFile):
+                        found[stem] = (os.path.join(folder, name), trialsFile)
+    return found
+
+
+def rescoreStudy(sessions, trial_length=1., Target_time=None):
+    """
+    Re-score all trials of the sessions ({name: (key log, _trials.npz file)}) in
+    one vectorised pass. Returns (names, rescored trials, see rescoredDtype).
+    """
+    if Target_time is None:
+        Target_time = .8 * trial_length
+    names = sorted(sessions)
+    allTrials = []
+    allRecords = []
+    offset = 0
+    for n, name in enumerate(names):
+        keyLog, trialsFile = sessions[name]
+        with np.load(trialsFile) as session:
+            trials = session['trials']
+        records = readKeyLog(keyLog).copy()
+        records = records[records['trial'] < len(trials)]
+        records['trial'] += offset
+        rescored = np.zeros(len(trials), dtype=rescoredDtype)
+        rescored['session'] = n
+        rescored['trial'] = np.arange(len(trials))
+        for field in ['signal', 'ssd']:
+            rescored[field] = trials[field]
+        rescored['recordedRT'] = trials['rt']
+        rescored['recordedCorrect'] = trials['correct']
+        allTrials.append(rescored)
+        allRecords.append(records)
+        offset += len(trials)
+    if not allTrials:
+        return names, np.zeros(0, dtype=rescoredDtype)
+    rescored = np.concatenate(allTrials)
+    lifted, RT, kd_start_synced = replayTrials(len(rescored), np.concatenate(allRecords), trial_length)
+    correct, feedback, colour = scoreTrialBatch(rescored['signal'], lifted, RT, kd_start_synced, Target_time)
+    rescored['response'] = lifted
+    rescored['rt'] = kd_start_synced
+    rescored['correct'] = correct
+    rescored['feedback'] = feedback
+    rescored['targetColour'] = colour
+    sameRT = np.isclose(rescored['rt'], rescored['recordedRT'], rtol=0, atol=1e-9, equal_nan=True)
+    rescored['changed'] = (rescored['correct'] != rescored['recordedCorrect']) | ~sameRT
+    return names, rescored
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Re-score OSARI sessions from their raw key events')
+    parser.add_argument('dataDirs', nargs='*', default=['data'])
+    parser.add_argument('--out', default='rescored.npz')
+    parser.add_argument('--trial-length', type=float, default=1., help='trial length (s)')
+    args = parser.parse_args(argv)
+
+    names, rescored = rescoreStudy(findKeyLogs(args.dataDirs), args.trial_length)
+    np.savez_compressed(args.out, trials=rescored, sessions=np.array(names, dtype=str),
+                        feedbackLabels=np.array(feedbackLabels))
+    print(f'{len(rescored)} trials of {len(names)} sessions re-scored, saved {args.out}')
+    changed = rescored[rescored['changed']]
+    print(f'{len(changed)} trials differ from the recorded scoring '
+          f'in {len(np.unique(changed["session"]))} sessions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+#Deferred logging for the time-critical phases of a trial. PsychoPy formats and writes
+#the pending log messages to the log file on every win.flip() (logging.flush); while the
+#buffer is held, flushing is skipped, so the messages stay in the logger's own queue of
+#pending messages (with the time they were logged) until release() (e.g. in the
+#inter-trial interval).
+import atexit
+from psychopy import logging
+
+
+class LogBuffer:
+    """
+    Skip the flushes of a logger (by default psychopy.logging.root) between hold()
+    and release(). Logging a message only adds it to the logger's pending messages,
+    so nothing is formatted or written until release() flushes them, and the log
+    file has the same messages and timestamps as without the buffer.
+    """
+    def __init__(self, logger=None):
+        self.logger = logging.root if logger is None else logger
+        self.holding = False
+        atexit.register(self.close)
+
+    def hold(self):
+        ''' Skip flushing until release()'''
+        if self.holding:
+            return
+        self.holding = True
+        # an instance attribute takes the place of the logger's flush method (see release)
+        self.logger.flush = self._skipFlush
+
+    def release(self):
+        ''' Write the pending messages to the logger's targets'''
+        if not self.holding:
+            return
+        self.holding = False
+        vars(self.logger).pop('flush', None)
+        self.logger.flush()
+
+    def close(self):
+        ''' Release the buffer for good (end of the session)'''
+        atexit.unregister(self.close)
+        self.release()
+
+    def _skipFlush(self):
+        pass
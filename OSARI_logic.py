@@ -0,0 +1,290 @@
+#These are the window-free task rules shared by OSARI.py, the session runner and the simulation engine
+#(nothing in here may import psychopy.visual or psychopy.event, so that it can be
+#imported on a machine without a display)
+import ast
+from os import path
+import numpy as np
+
+
+# Column names of the data_txt output (compatible with the BASTD analysis script)
+dataTxtHeader = 'id	block	trialType	trial	signal	response	correct	ssd	rt\n'
+
+
+def defaultExpInfo():
+    """
+    Return the default options of the Participant Information dialog box (expInfo)
+    """
+    return {'Participant ID': '0000',
+            'Age (Years)': '00',
+            'Gender': ['Female', 'Male', 'Transgender', 'Non-binary', 'Other', 'Prefer not to say'],
+            'Gender (other)': 'Please state if other selected',
+            'Default Parameters?': True
+            }
+
+
+def defaultMoreTaskInfo():
+    """
+    Return the default options of the Trial Structure (more_task_info[0]) and
+    Additional Parameters (more_task_info[1]) dialog boxes.
+    Options with several choices are lists, the first item being the default.
+    """
+    return [{'Practice Trials': True,
+             'Test Go Block': True,
+             'Method': ['staircase', 'fixed', 'weighted', 'interleaved', 'quest'],
+             'Trial Order': ['random', 'sequential']},
+            {'Count Down': False,
+             'Trial-by-trial Feedback': True,
+             'Step size (s)': 0.025,
+             'Lowest SSD (s)': 0.05,
+             'Highest SSD (s)': 0.775,
+             'Total Bar Height (in cm)': 15,
+             'Number of Test Mixed Blocks': 3,
+             'Full Screen': True,
+             'Color Blind Palette?': False,
+             'Response Key': ['space', 'left', 'right', 'up', 'down'],
+             'Remember Parameters': False
+             }]
+
+
+def selectDefaults(more_task_info):
+    """
+    Replace any option that is still a list of choices by its default (first) choice
+    """
+    for info in more_task_info:
+        for key, value in info.items():
+            if isinstance(value, list):
+                info[key] = value[0]
+    return more_task_info
+
+
+def updateInfo(infos, values):
+    """
+    Set parameters from a dictionary (e.g. {'Step size (s)': 0.05}) in the
+    dialog dictionary (e.g. expInfo, more_task_info[0] or [1]) that holds the key
+    """
+    for key, value in values.items():
+        for info in infos:
+            if key in info:
+                info[key] = value
+                break
+        else:
+            raise KeyError(f'unknown parameter: {key}')
+    return infos
+
+
+def setParams(more_task_info, params):
+    """
+    Set dialog parameters from "key=value" strings (e.g. "Step size (s)=0.05")
+    in the dialog dictionary (more_task_info[0] or [1]) that holds the key
+    """
+    return updateInfo(more_task_info, parseParams(params))
+
+
+def parseParams(params):
+    """Parse "key=value" strings into a dictionary (values as Python literals)"""
+    values = {}
+    for param in params:
+        key, value = param.split('=', 1)
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            pass  # keep strings such as 'staircase'
+        values[key.strip()] = value
+    return values
+
+
+def makeTaskInfo(more_task_info):
+    """
+    Build the technical task parameters that are not available in the GUIs
+    from the Additional Parameters (more_task_info[1]).
+    """
+    # Bar_top: how many cm above the centre of the screen (x = 0 y = 0) the top of the bar will be drawn.
+    Bar_top = more_task_info[1]['Total Bar Height (in cm)'] / 2
+    # Target_pos: position of target line relative to total bar height (default is 80% of bar height)
+    Target_pos = (.8 * more_task_info[1]['Total Bar Height (in cm)']) - Bar_top
+    taskInfo = {
+                'Bar base below fixation (cm)': Bar_top,
+                'Bar width (cm)': 3,
+                'Bar top above fixation (cm)': Bar_top,
+                'Target line width (cm)': 5,
+                'Target line above fixation (cm)': Target_pos,
+                'rise velocity (cm/sec)': 15, # RP - Equal this to bar height?
+                'trial length (max trial duration in seconds)': 1,
+                'StopS start pos. (seconds)': .5,
+                # settings of the adaptive SSD methods (see OSARI_ssd.py)
+                'SSD target p(respond)': .5,  # weighted
+                'Weighted initial step (s)': .1,  # weighted: halved at every reversal down to the step size
+                'Interleaved SSD starts (seconds)': [.35, .65],  # interleaved: one staircase per start SSD
+                'QUEST prior SD (s)': .15,  # quest: prior around the start SSD
+                'QUEST slope (s)': .04,  # quest: spread of the psychometric function
+                'QUEST lapse rate': .02,  # quest
+                # 'frame-locked': one key check, bar height and flip per refresh (see fillLoop)
+                # 'poll': check the keyboard as fast as possible
+                'Fill loop mode': 'frame-locked',
+                # draw the bar at its height for the predicted time of the next flip, rather than
+                # the time it is computed, and save the predicted and actual flip times
+                # (data/..._frameIntervals.npz, see FlipPredictor in OSARI_timing.py)
+                'Predict flip times': False,
+                # also save the trials as a NumPy structured array (data/..._trials.npz, see OSARI_store.py)
+                'Columnar output': False,
+                # show the running performance summary of the block on the block complete screen
+                'Show block summary': True,
+                # record the raw key events of every trial (data/..._keys.bin, see OSARI_keylog.py)
+                'Raw key log': False,
+                # save a Chrome trace of the phases of every trial (data/..._trace.json, see OSARI_trace.py)
+                'Trace': False,
+                # keep the log messages of the fill and feedback in memory and write them to the
+                # log file in the inter-trial interval (see OSARI_logbuffer.py)
+                'Deferred logging': False,
+                # poll the keyboard on a background thread during the fill (see OSARI_input.py)
+                'Input sampler': False,
+                'Input sampler rate (Hz)': 1000,
+                # no garbage collection during the fill and feedback, CPU pinning and raised
+                # priority (see OSARI_realtime.py); cores: e.g. [2, 3], None to leave as is
+                'Real-time mode': False,
+                'Real-time CPU cores': None,
+                'Real-time lock memory': False
+                }
+    return taskInfo
+
+
+def makeCondFileList(more_task_info, condDir='conditionFiles'):
+    """
+    Create a list of [condition file, number of repetitions] for the blocks
+    the user selected for. The only compulsory blocks are the test mixed blocks.
+    """
+    condFileList = []
+    # Practice Go Block
+    if more_task_info[0]['Practice Trials']:
+        condFileList.append([condDir + '/practiceGoTrials.xlsx', 1])
+    # Test Go Block
+    if more_task_info[0]['Test Go Block']:
+        condFileList.append([condDir + '/testGoBlocks.xlsx', 1])
+    # Practice Mixed Block
+    if more_task_info[0]['Practice Trials']:
+        condFileList.append([condDir + '/practiceMixedTrials.xlsx', 1])
+    # Test Mixed Block
+    condFileList.append([condDir + '/testBlocks.xlsx',
+                         more_task_info[1]['Number of Test Mixed Blocks']])
+    return condFileList
+
+
+def blockName(condFile):
+    """The name of a trial loop is the .xlsx filename"""
+    return path.splitext(path.split(condFile)[1])[0]
+
+
+def calculateStopTime(correct, stoptime, lower_ssd, upper_ssd, stepsize):
+    """
+    Calculate stoptime for next trial based on:
+        correct (int):
+            0 = incorrect stop OR
+            2 = correct stop
+        stoptime (float):
+            stoptime on previous trial
+        lower_ssd (float):
+            lowest possible ssd selected by the user in the Additional Parameters Dialog
+        upper_ssd (float)
+            highest possible ssd selected by the user in the Additional Parameters Dialog
+    """
+    if  correct == 2 and stoptime < upper_ssd:
+        stoptime = stoptime + stepsize
+    elif correct == 2 and stoptime == upper_ssd:
+        stoptime = upper_ssd
+    elif correct == 0 and stoptime > lower_ssd:
+        stoptime = stoptime - stepsize
+    elif correct == 0 and stoptime == lower_ssd:
+        stoptime = lower_ssd
+    return stoptime
+
+def calculateStopTimeBatch(correct, stoptime, lower_ssd, upper_ssd, stepsize):
+    """
+    Vectorised calculateStopTime: step many staircases at once.
+        correct (array of int):
+            outcome of the previous trial of each staircase (0 and 2 as above,
+            anything else leaves the stoptime unchanged)
+        stoptime (array of float):
+            stoptime of each staircase on the previous trial
+    The lower and upper SSD clamp the staircases exactly as in calculateStopTime.
+    """
+    up = (correct == 2) & (stoptime < upper_ssd)
+    down = (correct == 0) & (stoptime > lower_ssd)
+    return stoptime + stepsize * up - stepsize * down
+
+def setHeight(time_elapsed, this_stoptime, bar_height, trial_length):
+    """
+    Calculate "height" - the current height of the bar in cm
+    this will be added to the vertices position to adjust the size of
+    the filling (blue) bar.
+    """
+    if time_elapsed < this_stoptime:
+        height = (time_elapsed * bar_height) / trial_length
+    elif time_elapsed >= this_stoptime:
+        height = (this_stoptime * bar_height) / trial_length  # max_height
+    return height
+
+def setTargetCol(kd_start_synced, Target_time, palette):
+    """
+    set color of the target triangles based on distance
+    """
+    if abs(kd_start_synced - Target_time) < .02:
+        fillCol = palette[0]
+    elif .04 > abs(kd_start_synced - Target_time) >= .02:
+        fillCol= palette[1]
+    elif .06 > abs(kd_start_synced - Target_time) >= .04:
+        fillCol = palette[2]
+    else:
+        fillCol = palette[3]
+    return fillCol
+
+def scoreTrial(Signal, lifted, RT, kd_start_synced, Target_time, palette):
+    """
+    Score a trial once the fill loop has finished.
+    input:
+        Signal: 0 = go trial, 1 = stop trial
+        lifted: 0 = no lift, 1 = lift
+        RT: time the lift was detected (relative to start time)
+        kd_start_synced: key lift time relative to start time
+    returns (correct, feedback label in instructions.xlsx, target arrow colour), where correct is
+        -1 = omission error, 0 = incorrect stop, 1 = correct go, 2 = correct stop
+    """
+    if not lifted:
+        if Signal == 0:
+            # Omission Error
+            return -1, 'Omission', palette[3]
+        # Correct Stop
+        return 2, 'correctStop', palette[0]
+    if Signal == 0:
+        # Correct Go
+        if RT > .100:
+            feedback = 'correctGo'
+        else:
+            feedback = 'almostGo'
+        return 1, feedback, setTargetCol(kd_start_synced, Target_time, palette)
+    # Incorrect Stop
+    return 0, 'incorrectGo', palette[3]
+
+# Feedback labels of scoreTrialBatch (feedback index -> label in instructions.xlsx)
+feedbackLabels = ['Omission', 'correctStop', 'correctGo', 'almostGo', 'incorrectGo']
+
+def scoreTrialBatch(Signal, lifted, RT, kd_start_synced, Target_time):
+    """
+    Vectorised scoreTrial over arrays of trials (NaN RT/kd_start_synced if no lift).
+    returns (correct, feedback index in feedbackLabels, index of the target arrow colour in the palette)
+    """
+    Signal = np.asarray(Signal)
+    lifted = np.asarray(lifted).astype(bool)
+    go = Signal == 0
+    correct = np.select([~lifted & go, ~lifted, go], [-1, 2, 1], 0)
+    with np.errstate(invalid='ignore'):
+        almost = ~(np.asarray(RT, dtype=float) > .100)
+        distance = np.abs(np.asarray(kd_start_synced, dtype=float) - Target_time)
+    feedback = np.select([~lifted & go, ~lifted, go & almost, go], [0, 1, 3, 2], 4)
+    # setTargetCol bands: < 20 ms, 20-40 ms, 40-60 ms, further (or no go response)
+    bands = np.digitize(distance, [.02, .04, .06])
+    colour = np.select([~lifted & go, ~lifted, go], [3, 0, np.where(np.isnan(distance), 3, bands)], 3)
+    return correct, feedback, colour
+
+def formatDataTxtLine(participantID, block, trialType, trial, signal, response, correct, ssd, rt):
+    """Format one trial as a line of the data_txt file (see dataTxtHeader)"""
+    return f'{participantID}	{block}	{trialType}	{trial}	{signal}	{response}	{correct}	{ssd}	{rt}\n'
@@ -0,0 +1,187 @@
+"""
+Vectorised population simulator for the OSARI SSD staircase
+
+Steps the staircase of N simulated participants at once as NumPy arrays (see
+calculateStopTimeBatch in OSARI_logic.py), using an independent horse-race model
+of the go and stop processes. Use it to tune 'Step size (s)', 'Lowest SSD (s)' and
+'Highest SSD (s)' before a study, e.g.:
+
+    python OSARI_population.py --participants 100000 --param "Step size (s)=0.05"
+
+Only the test mixed blocks are simulated: as in OSARI.py the staircase starts at
+'StopS start pos. (seconds)' on the first test block and carries over between
+the repetitions of testBlocks.xlsx.
+"""
+
+from __future__ import absolute_import, division
+import argparse
+import os
+import time
+import numpy as np
+from OSARI_logic import *
+
+_thisDir = os.path.dirname(os.path.abspath(__file__))
+
+
+def simulatePopulation(blockSignals, nReps=3, nParticipants=100000,
+                       startSSD=.5, lower_ssd=.05, upper_ssd=.775, stepsize=.025,
+                       trial_length=1., trialOrder='random',
+                       goMean=.8, goSD=.07, goMeanSD=.03,
+                       ssrtMean=.22, ssrtSD=.03, ssrtMeanSD=.04,
+                       keepGoRT=False, seed=None):
+    """
+    Simulate the staircase of a population of participants.
+    input:
+        blockSignals: the Signal column of one test block (0 = go, 1 = stop)
+        nReps: number of test mixed blocks
+        goMean, goSD: population mean and within-participant SD of the lift time
+        goMeanSD: between-participant SD of the mean lift time
+        ssrtMean, ssrtSD, ssrtMeanSD: as above for the stop-signal reaction time
+        keepGoRT: also return the lift time of every go trial
+    returns a dict of arrays, one row per participant:
+        ssd: SSD on each stop trial (participants x stop trials)
+        respond: whether the key was lifted on each stop trial
+        goRT: lift time on each go trial, NaN for omissions (if keepGoRT)
+        goMean, ssrt: the participant's true mean lift time and SSRT
+        trueSSD: SSD at which the participant responds on 50% of stop trials
+        pRespond: p(respond|signal)
+        meanSSD: mean SSD over the second half of the stop trials
+        reversals: number of reversals of the staircase
+        trialsToConverge: stop trials until the SSD first came within one step of
+            trueSSD (-1 if it never did)
+    """
+    rng = np.random.default_rng(seed)
+    blockSignals = np.asarray(blockSignals, dtype=np.int8)
+    nTrials = len(blockSignals) * nReps
+    nStop = int(blockSignals.sum()) * nReps
+    nGo = nTrials - nStop
+    rows = np.arange(nParticipants)
+
+    # trial order of each participant (as TrialHandler: reshuffled every repetition)
+    signals = np.tile(blockSignals, (nParticipants, nReps))
+    if trialOrder == 'random':
+        for rep in range(nReps):
+            thisRep = slice(rep * len(blockSignals), (rep + 1) * len(blockSignals))
+            signals[:, thisRep] = rng.permuted(signals[:, thisRep], axis=1)
+
+    participantGo = rng.normal(goMean, goMeanSD, nParticipants)
+    participantSSRT = np.maximum(rng.normal(ssrtMean, ssrtMeanSD, nParticipants), 0.)
+
+    ssd = np.empty((nParticipants, nStop), dtype=np.float32)
+    respond = np.empty((nParticipants, nStop), dtype=bool)
+    goRT = np.empty((nParticipants, nGo), dtype=np.float32) if keepGoRT else None
+    stopN = np.zeros(nParticipants, dtype=np.intp)
+    goN = np.zeros(nParticipants, dtype=np.intp)
+
+    stoptime = np.full(nParticipants, startSSD)
+    correct = np.full(nParticipants, -1, dtype=np.int8)
+    for t in range(nTrials):
+        stoptime = calculateStopTimeBatch(correct, stoptime, lower_ssd, upper_ssd, stepsize)
+        stopTrial = signals[:, t] == 1
+        lift = np.maximum(participantGo + rng.normal(0., goSD, nParticipants), 0.)
+        stopFinish = stoptime + participantSSRT + rng.normal(0., ssrtSD, nParticipants)
+        lifted = (lift < trial_length) & ~(stopTrial & (lift > stopFinish))
+        # -1 = omission, 0 = incorrect stop, 1 = correct go, 2 = correct stop (see scoreTrial)
+        correct = np.where(stopTrial, np.where(lifted, 0, 2), np.where(lifted, 1, -1)).astype(np.int8)
+
+        s = rows[stopTrial]
+        ssd[s, stopN[s]] = stoptime[s]
+        respond[s, stopN[s]] = lifted[s]
+        stopN[s] += 1
+        if keepGoRT:
+            g = rows[~stopTrial]
+            goRT[g, goN[g]] = np.where(lifted[g], lift[g], np.nan)
+            goN[g] += 1
+
+    # the SSD at which p(respond|signal) = .5 under the (normal) horse race
+    trueSSD = np.clip(participantGo - participantSSRT, lower_ssd, upper_ssd)
+    direction = np.sign(np.diff(ssd, axis=1))
+    direction[direction == 0] = np.nan
+    reversals = np.zeros(nParticipants, dtype=np.intp)
+    lastDirection = np.full(nParticipants, np.nan)
+    for col in direction.T:  # carry the last step direction over unchanged SSDs
+        moved = ~np.isnan(col)
+        reversals += moved & ~np.isnan(lastDirection) & (col != lastDirection)
+        lastDirection = np.where(moved, col, lastDirection)
+    near = np.abs(ssd - trueSSD[:, None]) <= stepsize * 1.001
+    trialsToConverge = np.where(near.any(axis=1), near.argmax(axis=1), -1)
+
+    results = {
+        'ssd': ssd,
+        'respond': respond,
+        'goMean': participantGo,
+        'ssrt': participantSSRT,
+        'trueSSD': trueSSD,
+        'pRespond': respond.mean(axis=1),
+        'meanSSD': ssd[:, nStop // 2:].mean(axis=1),
+        'reversals': reversals,
+        'trialsToConverge': trialsToConverge,
+        }
+    if keepGoRT:
+        results['goRT'] = goRT
+    return results
+
+
+def summarise(results, lower_ssd, upper_ssd):
+    """Population summary of the convergence statistics"""
+    converged = results['trialsToConverge'] >= 0
+    ssdError = results['meanSSD'] - results['trueSSD']
+    finalSSD = results['ssd'][:, -1]
+    return {
+        'participants': len(results['pRespond']),
+        'mean p(respond|signal)': float(results['pRespond'].mean()),
+        'sd p(respond|signal)': float(results['pRespond'].std()),
+        'proportion within .25-.75': float(np.mean((results['pRespond'] >= .25) & (results['pRespond'] <= .75))),
+        'mean SSD error (s)': float(ssdError.mean()),
+        'sd SSD error (s)': float(ssdError.std()),
+        'mean reversals': float(results['reversals'].mean()),
+        'proportion converged': float(converged.mean()),
+        'median stop trials to converge': float(np.median(results['trialsToConverge'][converged])) if converged.any() else np.nan,
+        'proportion ending at an SSD limit': float(np.mean((finalSSD <= lower_ssd + 1e-6) | (finalSSD >= upper_ssd - 1e-6))),
+        }
+
+
+def main(argv=None):
+    from OSARI_simulation import importConditions
+    parser = argparse.ArgumentParser(description='Simulate the OSARI SSD staircase for a population')
+    parser.add_argument('--participants', type=int, default=100000)
+    parser.add_argument('--param', action='append', default=[],
+                        help='set a dialog parameter, e.g. "Step size (s)=0.05"')
+    parser.add_argument('--cond-file', default=os.path.join(_thisDir, 'conditionFiles', 'testBlocks.xlsx'))
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--go-mean', type=float, default=.8)
+    parser.add_argument('--go-sd', type=float, default=.07)
+    parser.add_argument('--ssrt-mean', type=float, default=.22)
+    parser.add_argument('--ssrt-sd', type=float, default=.03)
+    args = parser.parse_args(argv)
+
+    try:
+        more_task_info = setParams(selectDefaults(defaultMoreTaskInfo()), args.param)
+    except KeyError as err:
+        parser.error(err.args[0])
+    taskInfo = makeTaskInfo(more_task_info)
+
+    t0 = time.perf_counter()
+    results = simulatePopulation(
+                    [thisTrial['Signal'] for thisTrial in importConditions(args.cond_file)],
+                    nReps=more_task_info[1]['Number of Test Mixed Blocks'],
+                    nParticipants=args.participants,
+                    startSSD=taskInfo['StopS start pos. (seconds)'],
+                    lower_ssd=more_task_info[1]['Lowest SSD (s)'],
+                    upper_ssd=more_task_info[1]['Highest SSD (s)'],
+                    stepsize=more_task_info[1]['Step size (s)'],
+                    trial_length=taskInfo['trial length (max trial duration in seconds)'],
+                    trialOrder=more_task_info[0]['Trial Order'],
+                    goMean=args.go_mean, goSD=args.go_sd,
+                    ssrtMean=args.ssrt_mean, ssrtSD=args.ssrt_sd,
+                    seed=args.seed
+                    )
+    duration = time.perf_counter() - t0
+    for key, value in summarise(results, more_task_info[1]['Lowest SSD (s)'],
+                                      more_task_info[1]['Highest SSD (s)']).items():
+        print(f'{key}: {value:.4g}' if isinstance(value, float) else f'{key}: {value}')
+    print(f'simulated in {duration:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""
+Real-time mode of a session
+
+Two things outside the task can stall the fill loop for several milliseconds,
+long enough to drop a frame: Python's cyclic garbage collector, which runs
+whenever enough container objects have been allocated, and the operating system
+scheduling the PsychoPy process like any other process. In real-time mode:
+
+- garbage collection is disabled during the fill and feedback of every trial
+  (hold) and the garbage is collected in the inter-trial interval (release);
+  the objects created during setup are moved out of the collector's reach
+  (gc.freeze), so these collections stay short
+- the process is pinned to the chosen CPU cores
+- the scheduling priority is raised (psychopy.core.rush), where permitted
+- optionally, the memory of the process is locked in RAM (mlockall, Linux)
+
+Settings that cannot be applied (e.g. without the permission to raise the
+priority) are skipped, and listed in the end-of-session report with the
+collections that were moved from the fill and feedback to the ITI.
+"""
+
+from __future__ import absolute_import, division
+import atexit
+import ctypes
+import ctypes.util
+import gc
+import os
+import sys
+import time
+import numpy as np
+from psychopy import core, logging
+
+# mlockall flags (Linux)
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+
+def _libc():
+    return ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+
+class RealTimeMode:
+    """
+    Apply the real-time settings (apply), disable garbage collection between hold()
+    and release() and undo the settings at the end of the session (restore).
+    input:
+        cores: CPU cores to pin the process to (list of core numbers, None: leave as is)
+        priority: raise the scheduling priority
+        lockMemory: lock the memory of the process in RAM
+    """
+    def __init__(self, cores=None, priority=True, lockMemory=False):
+        self.cores = None if cores is None else sorted(int(n) for n in cores)
+        self.priority = priority
+        self.lockMemory = lockMemory
+        self.applied = []  # descriptions of the settings applied
+        self.notApplied = []  # (setting, reason)
+        self.holding = False
+        # per held phase: allocations, collections the collector would have run
+        self.allocations = []
+        self.deferred = []
+        # per release: duration (s) of the collection in the ITI and objects collected
+        self.collectTimes = []
+        self.collected = []
+        self.heldCollections = 0  # collections that ran anyway whilst holding (e.g. gc.collect())
+        self._oldAffinity = None
+        self._rushed = False
+        self._locked = False
+        self._frozen = False
+        self._gcWasEnabled = gc.isenabled()
+        self._collecting = False
+        self._active = False
+
+    def apply(self):
+        ''' Apply the settings (call at the end of setup)'''
+        if self._active:
+            return
+        self._active = True
+        if self.cores is not None:
+            self._setAffinity()
+        if self.priority:
+            self._rush()
+        if self.lockMemory:
+            self._lockMemory()
+        # move everything created so far out of reach of the collector
+        gc.collect()
+        gc.freeze()
+        self._frozen = True
+        self.applied.append(f'garbage collection deferred to the ITI '
+                            f'({gc.get_freeze_count()} objects frozen after setup)')
+        gc.callbacks.append(self._onCollect)
+        atexit.register(self.restore)
+
+    def hold(self):
+        ''' Disable garbage collection (start of the trial)'''
+        if self.holding or not self._active:
+            return
+        self.holding = True
+        self._startCount = gc.get_count()[0]
+        gc.disable()
+
+    def release(self):
+        ''' Collect the garbage of the held phase and enable garbage collection again (ITI)'''
+        if not self.holding:
+            return
+        self.holding = False
+        allocated = gc.get_count()[0] - self._startCount
+        self.allocations.append(allocated)
+        self.deferred.append(max(allocated, 0) // gc.get_threshold()[0])
+        self._collecting = True
+        t0 = time.perf_counter()
+        self.collected.append(gc.collect())
+        self.collectTimes.append(time.perf_counter() - t0)
+        self._collecting = False
+        gc.enable()
+
+    def restore(self):
+        ''' Undo the settings (end of the session)'''
+        if not self._active:
+            return
+        self._active = False
+        atexit.unregister(self.restore)
+        self.release()
+        if self._onCollect in gc.callbacks:
+            gc.callbacks.remove(self._onCollect)
+        if self._frozen:
+            gc.unfreeze()
+            self._frozen = False
+        if self._gcWasEnabled:
+            gc.enable()
+        if self._locked:
+            _libc().munlockall()
+            self._locked = False
+        if self._rushed:
+            core.rush(False)
+            self._rushed = False
+        if self._oldAffinity is not None:
+            try:
+                os.sched_setaffinity(0, self._oldAffinity)
+            except OSError:
+                pass
+            self._oldAffinity = None
+
+    def _onCollect(self, phase, info):
+        if phase == 'start' and self.holding and not self._collecting:
+            self.heldCollections += 1
+
+    def _setAffinity(self):
+        if not hasattr(os, 'sched_setaffinity'):
+            self.notApplied.append(('CPU cores', f'not supported on {sys.platform}'))
+            return
+        available = os.sched_getaffinity(0)
+        try:
+            os.sched_setaffinity(0, self.cores)
+        except (OSError, ValueError) as err:
+            self.notApplied.append(('CPU cores', f'could not pin to {self.cores} '
+                                    f'(available: {sorted(available)}): {err}'))
+            return
+        self._oldAffinity = available
+        self.applied.append(f'pinned to CPU cores {self.cores}')
+
+    def _rush(self):
+        try:
+            self._rushed = bool(core.rush(True))
+        except Exception as err:
+            self.notApplied.append(('priority', f'core.rush failed: {err}'))
+            return
+        if self._rushed:
+            self.applied.append('scheduling priority raised (psychopy.core.rush)')
+        else:
+            self.notApplied.append(('priority', 'not permitted (see the PsychoPy log for how to allow it)'))
+
+    def _lockMemory(self):
+        if not sys.platform.startswith('linux'):
+            self.notApplied.append(('memory lock', f'not supported on {sys.platform}'))
+            return
+        import resource
+        # only lock future allocations if they cannot run into the lock limit
+        flags = MCL_CURRENT
+        if resource.getrlimit(resource.RLIMIT_MEMLOCK)[0] == resource.RLIM_INFINITY:
+            flags |= MCL_FUTURE
+        libc = _libc()
+        if libc.mlockall(flags) != 0:
+            self.notApplied.append(('memory lock', f'mlockall failed: {os.strerror(ctypes.get_errno())}'))
+            return
+        self._locked = True
+        self.applied.append('memory locked in RAM' + ('' if flags & MCL_FUTURE else
+                                                      ' (current pages only: the memlock limit is not unlimited)'))
+
+    def report(self):
+        ''' Return an end-of-session report of the settings and the collections moved to the ITI'''
+        lines = ['Real-time mode report']
+        for setting in self.applied:
+            lines.append(f'applied: {setting}')
+        for setting, reason in self.notApplied:
+            lines.append(f'NOT applied: {setting}: {reason}')
+        if self.collectTimes:
+            collectMs = 1000 * np.asarray(self.collectTimes)
+            lines += [f'{len(self.collectTimes)} trials held without garbage collection, '
+                      f'{int(np.sum(self.allocations))} objects allocated '
+                      f'(max {int(np.max(self.allocations))} in a trial)',
+                      f'{int(np.sum(self.deferred))} automatic collections deferred from the fill and feedback '
+                      f'(generation 0 threshold {gc.get_threshold()[0]}), '
+                      f'{self.heldCollections} collections during the fill and feedback',
+                      f'ITI collections: mean {collectMs.mean():.3f} ms, max {collectMs.max():.3f} ms, '
+                      f'{int(np.sum(self.collected))} objects collected']
+        else:
+            lines.append('no trials were held')
+        return '\n'.join(lines) + '\n'
+
+    def save(self, fileName):
+        ''' Write the report to a text file and the log'''
+        report = self.report()
+        with open(fileName, 'w') as f:
+            f.write(report)
+        logging.info(report)
+        return report
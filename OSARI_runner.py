@@ -0,0 +1,117 @@
+"""
+Run back-to-back OSARI sessions without the dialog boxes
+
+The session parameters use the same keys as the dialog boxes of OSARI.py
+(expInfo, more_task_info[0] and more_task_info[1]); anything not given keeps
+its default. They are read from a JSON config file, e.g.
+
+    {"defaults": {"Number of Test Mixed Blocks": 2, "Full Screen": true},
+     "sessions": [{"Participant ID": "P01", "Age (Years)": "24"},
+                  {"Participant ID": "P02", "Response Key": "down", "Seed": 1234}]}
+
+and/or given on the command line:
+
+    python OSARI_runner.py stationA.json
+    python OSARI_runner.py --participant P01 --participant P02 --param "Count Down=True"
+
+One window is opened and the stimuli are prepared once for all sessions (they
+are only rebuilt if a session changes the bar height, response key or palette).
+Every session gets its own ExperimentHandler and output files. Between sessions
+the window waits for the space bar, escape quits (as it does during a session).
+"""
+
+from __future__ import absolute_import, division
+import argparse
+import json
+import os
+from psychopy import core, data, event, logging
+from psychopy.hardware import keyboard
+from OSARI_logic import defaultExpInfo, defaultMoreTaskInfo, selectDefaults, updateInfo, parseParams
+from OSARI_session import _thisDir, createWindow, stimulusParameters, TaskStimuli, runSession
+
+nextSessionText = "Next participant: {}\n\nPress space when ready to start"
+
+
+def sessionInfo(values):
+    """
+    Return (expInfo, more_task_info, seed) of a session with the given parameters
+    ('Seed' sets the seed of the session schedule, see OSARI_schedule.py)
+    """
+    values = dict(values)
+    seed = values.pop('Seed', None)
+    expInfo = selectDefaults([defaultExpInfo()])[0]
+    more_task_info = selectDefaults(defaultMoreTaskInfo())
+    updateInfo([expInfo] + more_task_info, values)
+    return expInfo, more_task_info, seed
+
+
+def readSessions(config=None, participants=(), params=()):
+    """
+    Return the list of session parameters from a config file (its "defaults" apply
+    to all of its "sessions"), then one session per participant ID, with the
+    "key=value" params applied to every session
+    """
+    defaults = {}
+    sessions = []
+    if config:
+        with open(config) as f:
+            settings = json.load(f)
+        defaults = settings.get('defaults', {})
+        sessions = [{**defaults, **session} for session in settings.get('sessions', [])]
+    sessions += [{**defaults, 'Participant ID': participantID} for participantID in participants]
+    overrides = parseParams(params)
+    return [{**session, **overrides} for session in sessions]
+
+
+def runSessions(sessions, dataDir=_thisDir):
+    """Run the sessions (list of parameter dictionaries) in one window"""
+    infos = [sessionInfo(values) for values in sessions]  # check every session before starting
+    kb = keyboard.Keyboard(bufferSize=10, waitForStart=True)
+    win = createWindow(infos[0][1])
+    stim = None
+    for n, (expInfo, more_task_info, seed) in enumerate(infos):
+        if more_task_info[1]['Full Screen'] != infos[0][1]['Full Screen']:
+            logging.warning('Full Screen cannot change between sessions, keeping the first session\'s window')
+        if stim is None or stim.parameters != stimulusParameters(more_task_info):
+            stim = TaskStimuli(win, more_task_info)
+        if n > 0:
+            message = stim.stimuli.message(nextSessionText.format(expInfo['Participant ID']))
+            message.draw()
+            win.flip()
+            if event.waitKeys(keyList=['space', 'escape'])[0] == 'escape':
+                core.quit()
+        expInfo['date'] = data.getDateStr()
+        runSession(win, kb, stim, expInfo, more_task_info, dataDir=dataDir, seed=seed)
+        logging.exp(f'session {n + 1} of {len(infos)} complete: {expInfo["Participant ID"]}')
+    win.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run back-to-back OSARI sessions in one window')
+    parser.add_argument('config', nargs='?', help='JSON file with "defaults" and "sessions"')
+    parser.add_argument('--participant', action='append', default=[],
+                        help='run a session for this participant ID (repeatable)')
+    parser.add_argument('--param', action='append', default=[],
+                        help='set a parameter for every session, e.g. "Count Down=True"')
+    parser.add_argument('--data-dir', default=_thisDir,
+                        help='directory to write data_txt/ and data/ output to')
+    args = parser.parse_args(argv)
+
+    sessions = readSessions(args.config, args.participant, args.param)
+    if not sessions:
+        parser.error('no sessions given (use a config file or --participant)')
+    try:
+        for values in sessions:
+            sessionInfo(values)
+    except KeyError as err:
+        parser.error(err.args[0])
+
+    # condition files and stimuli are found relative to the task directory
+    dataDir = os.path.abspath(args.data_dir)
+    os.chdir(_thisDir)
+    runSessions(sessions, dataDir=dataDir)
+    core.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#Seeded schedule of a whole session, computed before the first trial: the trial order
+#of every block (from seeded TrialHandlers) and the jitter of every trial, in one
+#table that the trial loop reads from and that is saved with the data
+import numpy as np
+from psychopy import data
+from OSARI_cache import importConditions
+from OSARI_logic import makeCondFileList, blockName
+
+# the jitter (wait before the bar starts filling) is one of these values
+jitters = np.arange(.5, 1, .05)
+
+# minimum time the block complete message is shown between test blocks
+blockCompleteWait = 3
+
+scheduleDtype = np.dtype([
+                ('blockIndex', 'i2'),
+                ('trialType', 'U32'),
+                ('block', 'i2'),  # repetition of the block
+                ('trial', 'i4'),  # trial of this repetition
+                ('condition', 'i4'),  # row of the condition file
+                ('signal', 'i1'),
+                ('fixedSSD', 'f8'),  # NaN if not given in the condition file
+                ('jitter', 'f8'),
+                ('duration', 'f8')  # jitter + full fill + ITI (go trials end earlier, when the key is lifted)
+                ])
+
+
+def newSeed():
+    """A random seed for a session (recorded so the session can be reproduced)"""
+    return int(np.random.SeedSequence().generate_state(1)[0] >> 1)
+
+
+def makeTrialHandlers(more_task_info, seed, condDir='conditionFiles', autoLog=True):
+    """One TrialHandler per block (in the order of condFileList); block n is seeded with seed + n"""
+    trialHandlers = []
+    for n, cond in enumerate(makeCondFileList(more_task_info, condDir)):
+        trialHandlers.append(data.TrialHandler(
+                        trialList=importConditions(cond[0]),  # import the .xlsx file (or its cached copy)
+                        nReps=cond[1],
+                        method=more_task_info[0]['Trial Order'],
+                        name=blockName(cond[0]),  # name of loop is .xlsx filename
+                        seed=seed + n,
+                        autoLog=autoLog
+                        ))
+    return trialHandlers
+
+
+def toFloat(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def makeSchedule(trialHandlers, seed, trial_length=1., ITI=2):
+    """
+    Table (see scheduleDtype) of every trial of the session in presentation order,
+    from the sequence the TrialHandlers were created with, and a jitter per trial
+    drawn with the session seed
+    """
+    rows = []
+    for blockIndex, block in enumerate(trialHandlers):
+        sequence = np.asarray(block.sequenceIndices)
+        for repN in range(block.nReps):
+            for trialN, condition in enumerate(sequence[:, repN]):
+                thisTrial = block.trialList[condition]
+                rows.append((blockIndex, block.name, repN, trialN, condition, thisTrial['Signal'],
+                             toFloat(thisTrial.get('fixedStopTime')), 0., 0.))
+    schedule = np.array(rows, dtype=scheduleDtype)
+    rng = np.random.default_rng(seed)
+    schedule['jitter'] = rng.choice(jitters, len(schedule))
+    schedule['duration'] = schedule['jitter'] + trial_length + ITI
+    return schedule
+
+
+def sessionDuration(schedule):
+    """Longest timed length of the session in seconds (excluding waiting for key presses)"""
+    test = schedule[schedule['trialType'] == 'testBlocks']
+    reps = len(np.unique(test['block']))
+    return float(schedule['duration'].sum()) + blockCompleteWait * max(reps - 1, 0)
+
+
+def saveSchedule(fileName, schedule, seed):
+    """Save the schedule and its seed (.npz)"""
+    np.savez(fileName, schedule=schedule, seed=seed)
+
+
+def loadSchedule(fileName):
+    """Return (schedule, seed) saved with saveSchedule"""
+    with np.load(fileName) as saved:
+        return saved['schedule'], int(saved['seed'])
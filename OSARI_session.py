@@ -0,0 +1,878 @@
+"""
+The OSARI task: window, stimuli and the block and trial loop of one session
+
+OSARI.py collects the session parameters with its dialog boxes and runs a single
+session; OSARI_runner.py runs back-to-back sessions in the same window, with the
+same prepared stimuli.
+"""
+
+from __future__ import absolute_import, division
+import atexit
+import os
+from functools import partial
+import numpy as np
+from psychopy import visual, core, data, event, logging
+from OSARI_functions import *
+from OSARI_logic import *
+from OSARI_writer import TrialWriter
+from OSARI_cache import importConditions
+from OSARI_store import SessionStore
+from OSARI_summary import BlockSummary
+from OSARI_keylog import KeyEventLog
+from OSARI_checkpoint import Checkpoint, checkpointSuffix, readCheckpoint, setAsideOutputs
+from OSARI_trace import Tracer, NullTracer
+from OSARI_logbuffer import LogBuffer
+from OSARI_input import InputSampler
+from OSARI_realtime import RealTimeMode
+from OSARI_schedule import newSeed, makeTrialHandlers, makeSchedule, sessionDuration, saveSchedule
+from OSARI_ssd import makeSSDMethod
+from OSARI_timing import FrameTimingLog, FlipPredictor
+from OSARI_stimuli import StimulusRegistry
+from OSARI_textures import cachedImage
+
+# Set the experiment name (expName)
+expName = 'OSARI'
+
+# output files are saved relative to this directory
+_thisDir = os.path.dirname(os.path.abspath(__file__))
+
+# Stimuli shown on every trial (hold instruction and feedback)
+trialStimuli = ['pressHold', 'Omission', 'correctStop', 'correctGo', 'almostGo', 'incorrectGo']
+
+# Message shown between the repetitions of the test block
+blockCompleteText = "Block {} of {} complete!\n\nPress space when ready to continue"
+
+# Message shown before the first trial of a resumed session
+resumeText = "Welcome back!\nThe task will continue where it stopped.\n\nPress space when ready to continue"
+
+# Stimuli shown at the start of each block
+blockStimuli = {
+                'practiceGoTrials': ['practiceGoWarning'],
+                'testGoBlocks': ['doYouUnderstand', 'testGoWarning'],
+                'practiceMixedTrials': ['stop_instr_image', 'practiceMixedWarning'],
+                'testBlocks': ['stop_instr_image', 'doYouUnderstand', 'testMixedWarning']
+                }
+
+
+#======================================
+# Hardware parameters
+#======================================
+def createWindow(more_task_info):
+    """Set up the window in which we will present stimuli"""
+    win = visual.Window(
+                    fullscr=more_task_info[1]['Full Screen'],
+                    winType='pyglet',
+                    monitor='testMonitor',
+                    color=[-1, -1, -1],
+                    colorSpace='rgb',
+                    blendMode='avg',
+                    allowGUI=False,
+                    size=(1440, 900)
+                    )
+    win.mouseVisible = False
+    return win
+
+
+#======================================
+# Stimulus Parameters
+#======================================
+def stimulusParameters(more_task_info):
+    """The parameters the stimuli are built from (if these change, build new TaskStimuli)"""
+    return (more_task_info[1]['Total Bar Height (in cm)'],
+            more_task_info[1]['Response Key'],
+            more_task_info[1]['Color Blind Palette?'])
+
+
+class TaskStimuli:
+    """
+    All the stimuli of the task for one window and one set of stimulus parameters.
+    OSARI presents participants with a (by default) white background bar
+    When participants depress the response key, the background bar appears to be filled from the bottom up
+    This is achieved by having a blue filling bar superimposed on the background bar
+    """
+    def __init__(self, win, more_task_info):
+        self.win = win
+        self.parameters = stimulusParameters(more_task_info)
+        taskInfo = makeTaskInfo(more_task_info)
+        # Target_pos: position of target line relative to total bar height (default is 80% of bar height)
+        Target_pos = taskInfo['Target line above fixation (cm)']
+
+        #---------------------------------------------------
+        # Task instructions
+        #---------------------------------------------------
+        # The instruction and feedback stimuli are only built when they are first needed
+        # (or prepared ahead of time during the ITI, see OSARI_stimuli.py)
+        self.stimuli = StimulusRegistry(win)
+
+        # String text feedback
+        instructions = importConditions(
+                        'conditionFiles/instructions.xlsx'
+                        )# import the excel file (or its cached copy, see OSARI_cache.py)
+
+        for thisInstruction in instructions:
+            if thisInstruction['respKey']:
+                thisTxt = thisInstruction['instruction'].format(
+                                variable = more_task_info[1]['Response Key']
+                                )
+            else:
+                thisTxt = thisInstruction['instruction']
+            self.stimuli.addText(
+                            f"{thisInstruction['label']}",
+                            pos=[thisInstruction['thisX'],
+                            thisInstruction['thisY']],
+                            height=1,
+                            wrapWidth = 30,
+                            color=[1, 1, 1],
+                            text=thisTxt,
+                            units='cm'
+                            )
+
+        # Visual image feedback
+        # The images are resampled to the window size once and memory-mapped from
+        # Stimuli/.cache on later runs (see OSARI_textures.py), when they are first used
+        for imageName in ['welcome_image', 'go_instr_image', 'stop_instr_image']:
+            self.stimuli.addImage(
+                            imageName,
+                            imageLoader=partial(cachedImage, 'Stimuli' + os.sep + imageName + '.jpeg', tuple(win.size)),
+                            units='norm',
+                            size=(2, 2),
+                            interpolate = True
+                            )
+
+        #---------------------------------------------------
+        # The Filling Bar (fillBar)
+        #---------------------------------------------------
+        bar_width_vert = [0 - (taskInfo['Bar width (cm)'] / 2), (taskInfo['Bar width (cm)'] / 2)]
+
+        # "vert" = vertices (corners) of filling bar in x y coordinates ([0, 0] = center)
+        vert = [(bar_width_vert[0], 0 - taskInfo['Bar base below fixation (cm)']),
+                (bar_width_vert[0], 0 - taskInfo['Bar base below fixation (cm)'] + .01),
+                (bar_width_vert[1], 0 - taskInfo['Bar base below fixation (cm)'] + .01),
+                (bar_width_vert[1], 0 - taskInfo['Bar base below fixation (cm)'])
+                ]
+
+        self.fillBar = FillingBar(
+                        win = win,
+                        vert = vert
+                        )
+
+        #---------------------------------------------------
+        # The Background Bar (Bar)
+        #---------------------------------------------------
+        # "fullvert" = vertices of the static background bar
+        fullvert = [(bar_width_vert[0], 0 - taskInfo['Bar base below fixation (cm)']),
+                    (bar_width_vert[0], taskInfo['Bar top above fixation (cm)']),
+                    (bar_width_vert[1], taskInfo['Bar top above fixation (cm)']),
+                    (bar_width_vert[1], 0 - taskInfo['Bar base below fixation (cm)'])
+                    ]
+
+        self.Bar = visual.ShapeStim(
+                        win, vertices=fullvert,
+                        fillColor='white',
+                        lineWidth=0,
+                        opacity=1,
+                        units='cm'
+                        )
+
+        #---------------------------------------------------
+        # The Target Arrows
+        #---------------------------------------------------
+        # OSARI denotes the 'target' through two equilateral triangles
+        # The inner most point of the triangles (pointing towards eachother) act as the target line
+        # Triangles were used so that a line was not superimposed onto the background bar
+
+        # The target width
+        target_width = 0.5
+
+        # Right Target Arrow
+        targetArrowRightvert = [(1.5, Target_pos),
+                                (1.5 + target_width, Target_pos + (target_width / np.sqrt(3))),
+                                (1.5 + target_width, Target_pos - (target_width / np.sqrt(3)))
+                                ]
+
+        self.targetArrowRight = visual.ShapeStim(
+                        win,
+                        vertices=targetArrowRightvert,
+                        fillColor='gray',
+                        lineWidth=0,
+                        opacity=1,
+                        units='cm'
+                        )
+
+        # Left Target Arrow
+        targetArrowLeftvert = [
+                        (-1.5 - target_width, Target_pos + (target_width / np.sqrt(3))),
+                        (-1.5 - target_width, Target_pos - (target_width / np.sqrt(3))),
+                        (-1.5, Target_pos)
+                        ]
+
+        self.targetArrowLeft = visual.ShapeStim(
+                        win,
+                        vertices=targetArrowLeftvert,
+                        fillColor='gray',
+                        lineWidth=0,
+                        opacity=1,
+                        units='cm'
+                        )
+
+        #---------------------------------------------------
+        # The Count Down (numbers over the bar at the target line)
+        #---------------------------------------------------
+        # The digits are laid out once and reused on every trial (see Countdown in OSARI_functions.py)
+        self.countdown = Countdown(
+                        win,
+                        self.stimuli,
+                        [self.Bar, self.fillBar, self.targetArrowRight, self.targetArrowLeft],
+                        more_task_info[1]['Response Key'],
+                        pos=[0, Target_pos]
+                        )
+
+        #---------------------------------------------------
+        # Set the stimulus colors
+        #---------------------------------------------------
+        if more_task_info[1]['Color Blind Palette?']:
+            self.palette = ['#009E73', '#F0E442', '#E69F00', '#D55E00']
+        else:
+            self.palette = ['Green', 'Yellow', 'Orange', 'Red']
+
+
+#======================================
+# Running performance summaries
+#======================================
+def summariseTrial(block, blockSummary, testSummary, taskInfo, Signal, lifted, ssd, rt):
+    """
+    Add a trial to the running summaries of the block and of all test blocks (see OSARI_summary.py).
+    At the end of a repetition of the block its summary is logged and a new summary started.
+    returns (the block summary, the block complete message of the next test block or None)
+    """
+    blockComplete = None
+    blockSummary.addTrial(Signal, lifted, ssd, rt)
+    if block.name == 'testBlocks':
+        testSummary.addTrial(Signal, lifted, ssd, rt)
+    if block.thisTrialN == len(block.trialList) - 1:
+        # end of this repetition of the block: log its summary
+        logging.exp(f'{block.name} {block.thisRepN + 1} of {block.nReps} summary: '
+                    f'{blockSummary.logLine()}')
+        if block.name == 'testBlocks' and block.thisRepN + 1 < block.nReps:
+            blockComplete = blockCompleteText.format(block.thisRepN + 1, block.nReps)
+            if taskInfo['Show block summary']:
+                blockComplete += '\n\n\n' + blockSummary.text()
+        blockSummary = BlockSummary()
+    return blockSummary, blockComplete
+
+
+#======================================
+# Run a session
+#======================================
+def runSession(win, kb, stim, expInfo, more_task_info, dataDir=_thisDir, seed=None, resume=None):
+    """
+    Run one session (all selected blocks) for one participant and save its data.
+    input:
+        win: the window (see createWindow)
+        kb: keyboard.Keyboard
+        stim: TaskStimuli built for win and these more_task_info
+        expInfo: participant information (including 'date')
+        more_task_info: the Trial Structure and Additional Parameters dialog dictionaries
+        dataDir: directory in which the data_txt/ and data/ folders are created
+        seed: seed of the trial order and jitters (see OSARI_schedule.py), random if None
+        resume: checkpoint of an interrupted session to resume (see OSARI_checkpoint.py);
+            expInfo and more_task_info must be those saved in the checkpoint
+    returns the ExperimentHandler of the session (closed)
+    """
+    stimuli = stim.stimuli
+    fillBar = stim.fillBar
+    Bar = stim.Bar
+    targetArrowRight = stim.targetArrowRight
+    targetArrowLeft = stim.targetArrowLeft
+    palette = stim.palette
+
+    #---------------------------------------------------
+    # Further Additional Parameters Outside of the GUIs
+    #---------------------------------------------------
+    # (see makeTaskInfo in OSARI_logic.py for the bar and target geometry)
+    taskInfo = makeTaskInfo(more_task_info)
+
+    # trial_length: max duration of a trial in seconds (time for bar to fill completely)
+    trial_length = taskInfo['trial length (max trial duration in seconds)']
+    bar_height = more_task_info[1]['Total Bar Height (in cm)']
+
+    # Target_time: time taken to reach target line (default: 80% of the total trial time)
+    Target_time = (.8 * taskInfo['trial length (max trial duration in seconds)'])
+
+    # Initial stop signal position
+    stoptime = taskInfo['StopS start pos. (seconds)']
+
+    # Frame intervals of the fill phase of every trial (see OSARI_timing.py)
+    frameTiming = FrameTimingLog(win.monitorFramePeriod)
+    # Draw the bar at its height for the predicted flip time (see FlipPredictor in OSARI_timing.py)
+    flipPredictor = None
+    if taskInfo['Predict flip times']:
+        flipPredictor = FlipPredictor(win.monitorFramePeriod)
+
+    #======================================
+    # Data output
+    #======================================
+    # Create output directories if they do not already exist
+    outDirs = ['data_txt', 'data']
+    outFiles = []
+    for outDir in outDirs:
+        if not os.path.exists(dataDir + os.sep + outDir + os.sep):
+            print(f'{outDir}folder did not exist, making one in current directory')
+            os.makedirs(f'{dataDir}{os.sep}{outDir}{os.sep}')
+        outFiles.append(f'{dataDir}{os.sep}{outDir}{os.sep}{expInfo["Participant ID"]}_{expName}_{expInfo["date"]}')
+
+    # Opt-in trace of the phases of every trial and of every flip (see OSARI_trace.py)
+    if taskInfo['Trace']:
+        tracer = Tracer(outFiles[1] + '_trace.json', participant=expInfo['Participant ID'], date=expInfo['date'])
+    else:
+        tracer = NullTracer()
+    tracer.traceFlips(win)
+    stimuli.tracer = tracer
+    tracer.begin('setup')
+
+    # The trials of an interrupted session are restored from its checkpoint (see OSARI_checkpoint.py)
+    restored = []
+    if resume is not None:
+        checkpointInfo, restored = readCheckpoint(resume)[:2]
+        seed = checkpointInfo['seed']
+        setAsideOutputs(outFiles[1])
+        # the txt file is written again from the restored trials
+        open(outFiles[0] + '.txt', 'w').close()
+
+    # Trials are written to the txt file from a background thread (see OSARI_writer.py)
+    # the header (i.e., column names) is written first
+    Output = outFiles[0]
+    trialWriter = TrialWriter(Output + '.txt')
+
+    #======================================
+    # Experiment Handler
+    #======================================
+    # Merge all info dictionaries so that we can save all the information to our output files
+    allInfo = {**expInfo, **more_task_info[0], **more_task_info[1]}
+    # The seed of the session schedule is saved with the data so the session can be reproduced
+    if seed is None:
+        seed = newSeed()
+    allInfo['Seed'] = seed
+
+    # SSD method of the stop trials (None for fixed SSDs, see OSARI_ssd.py);
+    # it is started again at the first test mixed block
+    ssdMethod = makeSSDMethod(more_task_info, taskInfo, seed)
+
+    # The trials are also saved as a structured array for merging studies (see OSARI_store.py)
+    sessionStore = None
+    if taskInfo['Columnar output']:
+        sessionStore = SessionStore(outFiles[1] + '_trials.npz', info=allInfo)
+    # The raw key events of every trial, for re-scoring (see OSARI_keylog.py)
+    keyLog = None
+    if taskInfo['Raw key log']:
+        keyLog = KeyEventLog(outFiles[1] + '_keys.bin', startTrial=len(restored))
+
+    # Create experiment handler
+    thisExp = data.ExperimentHandler(
+                    name=expName, version='beta',
+                    extraInfo=allInfo,
+                    savePickle=True, saveWideText=True,
+                    dataFileName=outFiles[1], autoLog=True
+                    )
+    thisExp.nextEntry()
+
+    # save a log file for detailed verbose information
+    logFile = logging.LogFile(outFiles[1] + '.log', level=logging.DEBUG)
+    logging.console.setLevel(logging.WARNING)
+    # The keyboard can be polled at a fixed rate on its own thread during the fill (see OSARI_input.py)
+    # (only with the psychtoolbox backend: the 'event' backend pumps the window's events
+    # in getKeys, which must not be done from another thread)
+    sampler = None
+    if taskInfo['Input sampler']:
+        if kb.getBackend() == 'ptb':
+            sampler = InputSampler(kb, [more_task_info[1]['Response Key'], 'escape'],
+                                   taskInfo['Input sampler rate (Hz)'])
+        else:
+            logging.warning(f"'Input sampler' needs the psychtoolbox keyboard backend (this keyboard "
+                            f"uses '{kb.getBackend()}'): the fill loop polls the keyboard itself")
+    # Log messages of the fill and feedback are written in the ITI (see OSARI_logbuffer.py)
+    logBuffer = None
+    if taskInfo['Deferred logging']:
+        logBuffer = LogBuffer()
+    # Garbage collection in the ITI only, CPU pinning and priority (see OSARI_realtime.py)
+    realTime = None
+    if taskInfo['Real-time mode']:
+        realTime = RealTimeMode(taskInfo['Real-time CPU cores'], lockMemory=taskInfo['Real-time lock memory'])
+
+    # Create a list of all the conditions the user selected for
+        # OSARI has two conditions:
+            # Go and Mixed
+                # Go conditions are just blocks with only go trials
+                # Mixed conditions are blocks with both go and stop trials
+
+        # The conditions are then further divided into those that are:
+                # Practice - block of 'practice' trials completed before the 'test' blocks
+                # Test - block of test trials that are used to assess participant performance
+
+    # Note that the only compulsory blocks are the test mixed blocks (see below)
+
+    # The condition files are excel or .xlsx files that contain two columns and X number of rows
+        # with 'X' being the number of rows the user wants the participant's to complete
+        # The columns are 'Signal' and 'fixedStopTime'
+
+    # Signal denotes the trial type, with 0's being a go trial and 1 being a stop trial
+    # Fixed stop time is only relevant for stop trials and
+        # only if participants are NOT using staircased stop-signal delays (SSD)
+
+    # The block conditions are listed by makeCondFileList (OSARI_logic.py)
+
+    #---------------------------------------------------
+    # Create trial handler object based on selected blocks
+    #---------------------------------------------------
+    # (block n is seeded with seed + n, see makeTrialHandlers in OSARI_schedule.py)
+    for thisTrials in makeTrialHandlers(more_task_info, seed):
+        thisExp.addLoop(thisTrials)
+
+    #======================================
+    # Begin task
+    #======================================
+    # At the beginning of the task, participants will be presented with the welcome image followed by the go instructions
+
+    if realTime is not None:
+        realTime.apply()
+    tracer.end()  # setup
+
+    #---------------------------------------------------
+    # Welcome Image
+    #---------------------------------------------------
+    tracer.begin('instructions')
+    stimuli['welcome_image'].draw()
+    win.flip()
+    # build the next instructions and the trial stimuli whilst the welcome image is shown
+    stimuli.prepare(['go_instr_image'] + trialStimuli + blockStimuli[thisExp.loops[0].name])
+    keyWatch(thisExp=thisExp)
+
+    #---------------------------------------------------
+    # Go Instructions
+    #---------------------------------------------------
+    stimuli['go_instr_image'].draw()
+    win.flip()
+    keyWatch(thisExp=thisExp)
+    tracer.end()  # instructions
+
+    #======================================
+    # Initialise Trials
+    #======================================
+    # Trial loop
+    correct = []
+    correctThisTrial = []
+    ITI = 2 # the inter-trial interval or wait period
+    # The order, SSD and jitter of every trial is worked out before the session starts
+    schedule = makeSchedule(thisExp.loops, seed, trial_length, ITI)
+    saveSchedule(outFiles[1] + '_schedule.npz', schedule, seed)
+    trialCount = 0
+    # Every completed trial is appended to the checkpoint, so an interrupted session can be resumed
+    if resume is None:
+        checkpoint = Checkpoint(outFiles[1] + checkpointSuffix, expInfo, more_task_info, seed, len(schedule))
+    else:
+        checkpoint = Checkpoint(resume, resumeFrom=len(restored))
+        logging.exp(f'Resuming {resume} at trial {len(restored)}')
+    logging.exp(f'Session seed: {seed}, {len(schedule)} trials, '
+                f'{sessionDuration(schedule) / 60:.1f} min excluding waiting for key presses')
+    print(f'{len(schedule)} trials, about {sessionDuration(schedule) / 60:.1f} min '
+          f'(plus the time taken to read the instructions)')
+    # running performance summaries of the current block and of all test blocks (see OSARI_summary.py)
+    blockSummary = BlockSummary()
+    testSummary = BlockSummary()
+    blockComplete = ''
+
+    #======================================
+    # Start the task
+    #======================================
+    for i, block in enumerate(thisExp.loops):
+        # iterate through the set of trials we have been given for this block
+        for thisTrial in block:
+            if block.thisTrialN == 0:
+                tracer.begin('block', name=block.name, rep=block.thisRepN)
+            tracer.begin('trial', block=block.name, rep=block.thisRepN, trial=block.thisTrialN)
+            # this trial in the session schedule
+            scheduled = schedule[trialCount]
+            trialCount += 1
+            #---------------------------------------------------
+            # Trials completed before the session was interrupted
+            #---------------------------------------------------
+            # are restored from the checkpoint rather than run again: their data is written
+            # and their outcome is replayed through the SSD method, which continues from
+            # the same state (see OSARI_checkpoint.py)
+            if trialCount <= len(restored):
+                record = restored[trialCount - 1]
+                if block.name == 'testBlocks' and block.thisRepN == 0 and block.thisTrialN == 0:
+                    correctThisTrial = correct
+                    ssdMethod = makeSSDMethod(more_task_info, taskInfo, seed)
+                    correct = []
+                if not more_task_info[0]['Method'] == 'fixed':
+                    stoptime = ssdMethod.update(correct)
+                    if stoptime != record['stoptime']:
+                        logging.warning(f'Restored trial {trialCount - 1}: SSD {stoptime} '
+                                        f'differs from the recorded {record["stoptime"]}')
+                trialValues = tuple(record['values'])
+                Signal, lifted, correct, this_stoptime, kd_start_synced = trialValues[4:]
+                trialWriter.write(*trialValues)
+                if sessionStore is not None:
+                    sessionStore.write(*trialValues)
+                for header, value in record['row'].items():
+                    thisExp.addData(header, value)
+                thisExp.nextEntry()
+                # no frames were recorded, but the trial keeps its place in the frame timing log
+                frameTiming.addTrial(i, block.name, block.thisRepN, block.thisTrialN, [])
+                blockSummary, nextBlockComplete = summariseTrial(
+                                block, blockSummary, testSummary, taskInfo,
+                                Signal, lifted, this_stoptime, kd_start_synced
+                                )
+                if nextBlockComplete:
+                    blockComplete = nextBlockComplete
+                tracer.end()  # trial
+                if block.thisTrialN == len(block.trialList) - 1:
+                    tracer.end()  # block
+                continue
+            if restored and trialCount == len(restored) + 1:
+                # first trial after resuming
+                stimuli.message(resumeText).draw()
+                win.flip()
+                keyWatch(thisExp=thisExp)
+            #---------------------------------------------------
+            # Warning of upcoming trials and further instructions
+            #---------------------------------------------------
+            tracer.begin('instructions')
+            # if this is a practice go block
+            if block.name == 'practiceGoTrials':
+                # and if this is the first repetition of this block,
+                if block.thisRepN == 0 and block.thisTrialN ==0:
+                    # warn of upcoming practice block of go trials
+                    stimuli['practiceGoWarning'].draw()
+                    win.flip()
+                    keyWatch(thisExp=thisExp)
+            # if this is a test go block
+            if block.name == 'testGoBlocks':
+                if block.thisRepN == 0 and block.thisTrialN ==0:
+                    # ask participant if they understand the task
+                    stimuli['doYouUnderstand'].draw()
+                    win.flip()
+                    understand = event.waitKeys(keyList=['y', 'n'])
+                    if understand[0] == 'n':
+                        checkpoint.abort()  # a deliberate quit: the session is not offered for resuming
+                        thisExp.close()
+                        core.quit()
+                    # warn of upcoming test block of go trials
+                    stimuli['testGoWarning'].draw()
+                    win.flip()
+                    keyWatch(thisExp=thisExp)
+            # if this is a practice block of go and stop trials
+            if block.name == 'practiceMixedTrials':
+                if block.thisRepN == 0 and block.thisTrialN ==0:
+                    stimuli['stop_instr_image'].draw()
+                    win.flip()
+                    keyWatch(thisExp=thisExp)
+                   # warn of upcoming practice mixed block of trials
+                    stimuli['practiceMixedWarning'].draw()
+                    win.flip()
+                    keyWatch(thisExp=thisExp)
+            # if this is a test block of go and stop trials
+            if block.name == 'testBlocks':
+                # If practice trials were not selected
+                if block.thisRepN == 0 and block.thisTrialN == 0 and more_task_info[0]['Practice Trials']==False:
+                    # give the stop instruction image
+                    stimuli['stop_instr_image'].draw()
+                    win.flip()
+                    keyWatch(thisExp=thisExp)
+                if block.thisRepN == 0 and block.thisTrialN ==0:
+                    # ask participant if they understand the task
+                    stimuli['doYouUnderstand'].draw()
+                    win.flip()
+                    understand = event.waitKeys(keyList=['y','n'])
+                    if understand[0] == 'n':
+                        checkpoint.abort()  # a deliberate quit: the session is not offered for resuming
+                        thisExp.close()
+                        core.quit()
+                    # warn of upcoming test block of mixed trials
+                    stimuli['testMixedWarning'].draw()
+                    win.flip()
+                    keyWatch(thisExp=thisExp)
+                    #Store whether the response was correct = 2 or incorrect (correct = 0)
+                    correctThisTrial = correct
+                    # Set the stopTime to the starting stop-signal delay (SSD) requested
+                    stoptime = taskInfo['StopS start pos. (seconds)']
+                    ssdMethod = makeSSDMethod(more_task_info, taskInfo, seed)
+                    correct = []  # Reset correct
+                    trial_label = 'main'
+                #---------------------------------------------------
+                # Give feedback after each test block is completed
+                #---------------------------------------------------
+                elif block.thisRepN > 0 and block.thisTrialN == 0:
+                    # set message
+                    Blocks_completed = stimuli.message(blockComplete)
+                    # draw the message
+                    Blocks_completed.draw()
+                    win.flip()
+                    trialWriter.flush()  # make sure the completed block is on disk
+                    core.wait(3)# Wait at least 3 seconds untill a key press is registered
+                    keyWatch(thisExp=thisExp)
+            tracer.end()  # instructions
+            #---------------------------------------------------
+            # Set or Reset variables at the beginning of the trial
+            #---------------------------------------------------
+            # Set or reset the target arrows to be gray
+            targetArrowRight.fillColor = 'gray'
+            targetArrowLeft.fillColor = 'gray'
+            trial_label = block.name
+            # Set or reset the SSD (only relevant if it is a stop trial)
+            # (staircase, weighted, interleaved or quest, see OSARI_ssd.py)
+            if not more_task_info[0]['Method'] == 'fixed':
+                stoptime = ssdMethod.update(correct)
+            elif more_task_info[0]['Method'] == 'fixed':
+                stoptime = scheduled['fixedSSD']
+            # Reset correct
+            correct = []
+            # Set the SSD
+            Signal = thisTrial['Signal']
+            if Signal == 1:
+                # If stop trial, this_stoptime (SSD) = stoptime
+                this_stoptime = stoptime
+            else:
+                # If go trial, SSD is just trial length
+                this_stoptime = trial_length
+            #---------------------------------------------------
+            # Begin trial
+            #---------------------------------------------------
+            # Tell participant to hold response key down
+            tracer.begin('pressHold')
+            stimuli['pressHold'].draw()
+            win.flip()
+            kb.start()  # Watch for the response key to be depressed
+            kb.clearEvents()
+            keyWatch(thisExp = thisExp, keyList=[more_task_info[1]['Response Key']])
+            tracer.end()  # pressHold
+            # Reset the vertices to their begining position
+            fillBar.reset()
+            # Count down before trial starts
+            if more_task_info[1]['Count Down']:
+                with tracer.span('countdown'):
+                    stim.countdown.run(kb, thisExp)
+            # no log messages are formatted or written from here to the ITI
+            if logBuffer is not None:
+                logBuffer.hold()
+            if realTime is not None:
+                realTime.hold()
+            stimList = [targetArrowLeft, targetArrowRight, Bar, fillBar]
+            for thisStim in stimList:
+                thisStim.setAutoDraw(True)
+            # Set autoDraw for the stimulus elements before trial starts
+            #   (Note: draw order is defined by the order in which setAutoDraw is called)
+            win.flip()
+            jitter = scheduled['jitter']
+            with tracer.span('jitter'):
+                core.wait(jitter)
+            # Record the frame intervals of the fill (the jitter wait is not a frame interval)
+            win.frameIntervals = []
+            win.recordFrameIntervals = True
+            # Whilst we are waiting for the button to be lifted, fill the bar
+            # (see fillLoop in OSARI_functions.py)
+            tracer.begin('fill', signal=Signal)
+            waiting, lift_time, kd_start_synced = fillLoop(
+                            win,
+                            kb,
+                            fillBar,
+                            more_task_info[1]['Response Key'],
+                            this_stoptime,
+                            bar_height,
+                            trial_length,
+                            frameLocked=taskInfo['Fill loop mode'] == 'frame-locked',
+                            keyLog=keyLog,
+                            sampler=sampler,
+                            flipPredictor=flipPredictor
+                            )
+            tracer.end(lifted=waiting == 0)  # fill
+            # Stop recording frame intervals and summarise them for this trial
+            win.recordFrameIntervals = False
+            frameStats = frameTiming.addTrial(
+                            i,
+                            block.name,
+                            block.thisRepN,
+                            block.thisTrialN,
+                            win.frameIntervals,
+                            None if flipPredictor is None else flipPredictor.takeFlips()
+                            )
+            # If this was a stop trial then the above while loop will have broken when the stoplimit was
+            # reached. but, we still want to wait until the end of the trial to make sure they
+            # actually hold and don't lift as soon as the stop limit is reached
+            #---------------------------------------------------
+            # End of Trial:
+            #---------------------------------------------------
+            kb.stop()  # Stop watching the keyboard
+            tracer.begin('feedback')
+            # if the bar has filled but we are still waiting for the key to lift
+            if waiting == 1:
+                kd_start_synced = 'NaN'
+                lifted = 0
+                RT = 'NaN'
+            # If the key was lifted before the bar filled
+            else:
+                lifted = 1
+                RT = lift_time
+            # Score the trial (see scoreTrial in OSARI_logic.py):
+            #   Omission Error, Correct Stop, Correct Go or Incorrect Stop
+            correct, feedbackLabel, arrowCol = scoreTrial(
+                            Signal,
+                            lifted,
+                            RT,
+                            kd_start_synced,
+                            Target_time,
+                            palette
+                            )
+            feedback = stimuli[feedbackLabel]
+            # Change the colour of the target arrows based on feedback
+            targetArrowRight.fillColor = arrowCol
+            targetArrowLeft.fillColor = arrowCol
+            if more_task_info[1]['Trial-by-trial Feedback']:
+                feedback.setAutoDraw(True)
+            win.flip()
+            # the ITI starts with the feedback (writing the trial counts against it)
+            itiClock = core.Clock()
+            tracer.end()  # feedback
+            if Signal == 0:
+                this_stoptime = 'NaN'
+            #---------------------------------------------------
+            # Write data to .txt file
+            #---------------------------------------------------
+            tracer.begin('write')
+            trialValues = (
+                            expInfo["Participant ID"],
+                            block.thisRepN,
+                            trial_label,
+                            block.thisTrialN,
+                            Signal,
+                            lifted,
+                            correct,
+                            this_stoptime,
+                            kd_start_synced
+                            )
+            trialWriter.write(*trialValues)
+            if sessionStore is not None:
+                sessionStore.write(*trialValues)
+            if keyLog is not None:
+                keyLog.endTrial()
+            #---------------------------------------------------
+            # Write data to .csv file
+            #---------------------------------------------------
+            # Column headers
+            colHeaders=[
+                'block',
+                'trialType',
+                'trial',
+                'signal',
+                'response',
+                'correct',
+                'ssd',
+                'rt'
+                ]
+            # Column values for given trial
+            values =[
+                i,
+                trial_label,
+                block.thisTrialN,
+                Signal,
+                lifted,
+                correctThisTrial,
+                this_stoptime,
+                kd_start_synced
+                ]
+            row = dict(zip(colHeaders, values))
+            # State of the SSD method on this trial (e.g. the QUEST estimate)
+            if ssdMethod is not None:
+                row.update(ssdMethod.state())
+            # Frame timing of the fill phase
+            row.update(frameStats)
+            for header, value in row.items():
+                thisExp.addData(header, value)
+            thisExp.nextEntry()
+            checkpoint.addTrial(trialCount - 1, i, block.thisRepN, block.thisTrialN, stoptime, trialValues, row)
+            tracer.end()  # write
+            # build the stimuli of the next block during the ITI
+            tracer.begin('ITI')
+            if logBuffer is not None:
+                logBuffer.release()
+            if realTime is not None:
+                realTime.release()
+            blockSummary, nextBlockComplete = summariseTrial(
+                            block, blockSummary, testSummary, taskInfo,
+                            Signal, lifted, this_stoptime, kd_start_synced
+                            )
+            if nextBlockComplete:
+                # lay out the block complete message of the next repetition
+                blockComplete = nextBlockComplete
+                stimuli.message(blockComplete)
+            if block.nRemaining == 0 and i + 1 < len(thisExp.loops):
+                stimuli.prepare(blockStimuli.get(thisExp.loops[i + 1].name, []))
+            if keyLog is not None:
+                keyLog.flush()
+            # the trial is on disk before the next one starts
+            checkpoint.sync()
+            with tracer.span('ITI wait'):
+                core.wait(ITI - itiClock.getTime())
+            # Reset visual stimuli for next trial
+            stimList = [
+                feedback,
+                targetArrowLeft,
+                targetArrowRight,
+                Bar,
+                fillBar]
+            for thisStim in stimList:
+                thisStim.setAutoDraw(False)
+            tracer.end()  # ITI
+            tracer.end()  # trial
+            if block.thisTrialN == len(block.trialList) - 1:
+                tracer.end()  # block
+        # make sure the block is on disk before moving on
+        with tracer.span('flush'):
+            trialWriter.flush()
+    #======================================
+    # End Task
+    #======================================
+    EndMessage = stimuli.message(
+                    "The End!\nThanks for taking part!\n[press a key to end]",
+                    pos=(0, 0.4)
+                    )
+    EndMessage.draw()
+    win.flip()
+    event.waitKeys()
+    tracer.begin('export')
+    trialWriter.close()
+    if sessionStore is not None:
+        sessionStore.close()
+    if keyLog is not None:
+        keyLog.close()
+    if sampler is not None:
+        sampler.close()
+    if logBuffer is not None:
+        logBuffer.close()
+    # Save the raw frame intervals next to the .csv and report trials with dropped frames
+    frameTiming.save(outFiles[1] + '_frameIntervals.npz')
+    timingReport = frameTiming.report()
+    with open(outFiles[1] + '_timing.txt', 'w') as b:
+        b.write(timingReport)
+    logging.info(timingReport)
+    print(timingReport)
+    if testSummary.goTrials or testSummary.stopTrials:
+        logging.exp(f'testBlocks summary: {testSummary.logLine()}')
+        print(f'Test blocks: {testSummary.text()}')
+    if realTime is not None:
+        realTime.restore()
+        print(realTime.save(outFiles[1] + '_realtime.txt'))
+    checkpoint.close()
+    thisExp.close()
+    # the ExperimentHandler closes itself at exit; it is closed now, so let it go
+    # (OSARI_runner.py runs many sessions in one process)
+    atexit.unregister(thisExp.close)
+    tracer.end()  # export
+    tracer.stopTracingFlips(win)
+    stimuli.tracer = NullTracer()
+    tracer.save()
+    # stop logging to this session's log file
+    logging.flush()
+    logging.root.removeTarget(logFile)
+    return thisExp
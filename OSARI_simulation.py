@@ -0,0 +1,319 @@
+"""
+Headless simulation of a full OSARI session
+
+Runs the same block/trial logic as OSARI.py (condFileList, TrialHandler ordering,
+SSD method (OSARI_ssd.py), setHeight, scoring and the data_txt/csv output) against a
+simulated participant, with no window, keyboard or real clock. Use it to check
+condition files and staircase settings before a study goes live, e.g.:
+
+    python OSARI_simulation.py --participants 200
+    python OSARI_simulation.py --param "Step size (s)=0.05" --out sim_data
+
+A simulated participant is any object with a method
+    respond(Signal, ssd, trial_length)
+that returns the key lift time in seconds relative to the start of the fill
+(i.e. what kd_start_synced measures), or None if the key is never lifted.
+"""
+
+from __future__ import absolute_import, division
+import argparse
+import copy
+import os
+import time
+import numpy as np
+from psychopy import data
+from OSARI_logic import *
+import OSARI_cache
+from OSARI_store import SessionStore
+from OSARI_keylog import KeyEventLog
+from OSARI_schedule import newSeed, makeTrialHandlers, makeSchedule, saveSchedule
+from OSARI_ssd import makeSSDMethod
+
+_thisDir = os.path.dirname(os.path.abspath(__file__))
+
+# Parsed condition files, so that repeated sessions do not re-read the .xlsx files
+_conditions = {}
+
+
+def importConditions(condFile):
+    """Import (and keep) the trial list of a condition file (see OSARI_cache.py)"""
+    if condFile not in _conditions:
+        _conditions[condFile] = OSARI_cache.importConditions(condFile)
+    return _conditions[condFile]
+
+
+class SimulatedClock:
+    """
+    Stands in for the psychopy clocks: time only moves when the engine waits
+    """
+    def __init__(self):
+        self.t = 0.
+
+    def getTime(self):
+        return self.t
+
+    def wait(self, secs):
+        self.t += secs
+
+
+class HorseRaceParticipant:
+    """
+    Simulated participant following the independent horse-race model:
+    the go process finishes at a lift time drawn around the target and, on stop
+    trials, the stop process finishes one SSRT after the stop-signal. The key is
+    lifted only if the go process wins the race.
+    """
+    def __init__(self, goMean=.8, goSD=.07, ssrtMean=.22, ssrtSD=.03, pOmission=0., seed=None):
+        self.goMean = goMean
+        self.goSD = goSD
+        self.ssrtMean = ssrtMean
+        self.ssrtSD = ssrtSD
+        self.pOmission = pOmission
+        self.rng = np.random.default_rng(seed)
+
+    def respond(self, Signal, ssd, trial_length):
+        ''' Return the lift time relative to the start of the fill (None = no lift)'''
+        if self.pOmission and self.rng.random() < self.pOmission:
+            return None
+        lift = max(self.rng.normal(self.goMean, self.goSD), 0.)
+        if Signal == 1 and lift > ssd + self.rng.normal(self.ssrtMean, self.ssrtSD):
+            return None  # the stop process won the race
+        if lift >= trial_length:
+            return None
+        return lift
+
+
+def simulateFill(liftTime, this_stoptime, bar_height, trial_length, framePeriod):
+    """
+    Run the fill loop of OSARI.py one frame at a time.
+    The lift is detected on the first frame at or after liftTime.
+    returns (waiting, lift_time, height)
+    """
+    waiting = 1
+    lift_time = 'NaN'
+    height = 0
+    time_elapsed = 0
+    while time_elapsed < trial_length and waiting == 1:
+        time_elapsed = time_elapsed + framePeriod
+        height = setHeight(
+                        time_elapsed,
+                        this_stoptime,
+                        bar_height,
+                        trial_length
+                        )
+        if liftTime is not None and liftTime <= time_elapsed:
+            lift_time = time_elapsed
+            waiting = 0
+    return waiting, lift_time, height
+
+
+class SimulatedSession:
+    """
+    One OSARI session run against a simulated participant.
+    input:
+        more_task_info: the two dialog dictionaries (see defaultMoreTaskInfo);
+            options that are still lists are set to their default
+        participant: simulated participant (see HorseRaceParticipant)
+        participantID: written to the id column of the output
+        outDir: if given, data_txt/ and data/ output is written there as OSARI.py would
+        frameRate: refresh rate (Hz) of the simulated display
+        seed: seed for trial order and jitter
+    """
+    def __init__(self, more_task_info, participant, participantID='sim', outDir=None,
+                 frameRate=60., seed=None, condDir=os.path.join(_thisDir, 'conditionFiles'), ITI=2):
+        self.more_task_info = selectDefaults(copy.deepcopy(more_task_info))
+        self.taskInfo = makeTaskInfo(self.more_task_info)
+        self.participant = participant
+        self.participantID = participantID
+        self.outDir = outDir
+        self.framePeriod = 1. / frameRate
+        self.seed = newSeed() if seed is None else seed
+        self.condDir = condDir
+        self.ITI = ITI
+        self.clock = SimulatedClock()
+
+    def run(self):
+        """
+        Run the session and return a list of trial records (one dict per trial
+        with the data_txt columns, plus 'blockIndex' and 'sessionTime')
+        """
+        more_task_info = self.more_task_info
+        taskInfo = self.taskInfo
+        trial_length = taskInfo['trial length (max trial duration in seconds)']
+        bar_height = more_task_info[1]['Total Bar Height (in cm)']
+        Target_time = .8 * trial_length
+        palette = ['Green', 'Yellow', 'Orange', 'Red']
+        stoptime = taskInfo['StopS start pos. (seconds)']
+        ssdMethod = makeSSDMethod(more_task_info, taskInfo, self.seed)
+
+        thisExp = None
+        keyLog = None
+        if self.outDir:
+            outFiles = []
+            date = data.getDateStr()
+            for outDir in ['data_txt', 'data']:
+                os.makedirs(os.path.join(self.outDir, outDir), exist_ok=True)
+                outFiles.append(os.path.join(self.outDir, outDir,
+                                             f'{self.participantID}_OSARI_{date}'))
+            thisExp = data.ExperimentHandler(
+                            name='OSARI', version='beta',
+                            extraInfo={'Participant ID': self.participantID,
+                                       **more_task_info[0], **more_task_info[1], 'Seed': self.seed},
+                            savePickle=False, saveWideText=True,
+                            dataFileName=outFiles[1], autoLog=False
+                            )
+            thisExp.nextEntry()
+            if taskInfo['Raw key log']:
+                keyLog = KeyEventLog(outFiles[1] + '_keys.bin')
+
+        records = []
+        correct = []
+        correctThisTrial = []
+        # the same blocks and trial order as OSARI.py (see OSARI_schedule.py)
+        trialHandlers = makeTrialHandlers(self.more_task_info, self.seed, self.condDir, autoLog=False)
+        schedule = makeSchedule(trialHandlers, self.seed, trial_length, self.ITI)
+        if thisExp is not None:
+            saveSchedule(outFiles[1] + '_schedule.npz', schedule, self.seed)
+        trialCount = 0
+        for i, block in enumerate(trialHandlers):
+            if thisExp is not None:
+                thisExp.addLoop(block)
+            for thisTrial in block:
+                if block.name == 'testBlocks':
+                    if block.thisRepN == 0 and block.thisTrialN == 0:
+                        correctThisTrial = correct
+                        stoptime = taskInfo['StopS start pos. (seconds)']
+                        ssdMethod = makeSSDMethod(more_task_info, taskInfo, self.seed)
+                        correct = []
+                    elif block.thisRepN > 0 and block.thisTrialN == 0:
+                        self.clock.wait(3)  # block complete message
+                trial_label = block.name
+                if not more_task_info[0]['Method'] == 'fixed':
+                    stoptime = ssdMethod.update(correct)
+                elif more_task_info[0]['Method'] == 'fixed':
+                    stoptime = schedule[trialCount]['fixedSSD']
+                Signal = thisTrial['Signal']
+                if Signal == 1:
+                    this_stoptime = stoptime
+                else:
+                    this_stoptime = trial_length
+                self.clock.wait(schedule[trialCount]['jitter'])
+                trialCount += 1
+                liftTime = self.participant.respond(Signal, this_stoptime, trial_length)
+                waiting, lift_time, height = simulateFill(
+                                liftTime,
+                                this_stoptime,
+                                bar_height,
+                                trial_length,
+                                self.framePeriod
+                                )
+                if waiting == 1:
+                    kd_start_synced = 'NaN'
+                    lifted = 0
+                    RT = 'NaN'
+                    self.clock.wait(trial_length)
+                else:
+                    kd_start_synced = liftTime
+                    lifted = 1
+                    RT = lift_time
+                    self.clock.wait(lift_time)
+                correct, feedbackLabel, arrowCol = scoreTrial(
+                                Signal,
+                                lifted,
+                                RT,
+                                kd_start_synced,
+                                Target_time,
+                                palette
+                                )
+                if Signal == 0:
+                    this_stoptime = 'NaN'
+                records.append({'id': self.participantID,
+                                'block': block.thisRepN,
+                                'trialType': trial_label,
+                                'trial': block.thisTrialN,
+                                'signal': Signal,
+                                'response': lifted,
+                                'correct': correct,
+                                'ssd': this_stoptime,
+                                'rt': kd_start_synced,
+                                'blockIndex': i,
+                                'sessionTime': self.clock.getTime(),
+                                **(ssdMethod.state() if ssdMethod is not None else {})})
+                if keyLog is not None:
+                    # the key was pressed (half a second) before the start of the trial
+                    trialStart = self.clock.getTime() - (lift_time if lifted else trial_length)
+                    keyLog.addReset(trialStart)
+                    keyLog.addKey(more_task_info[1]['Response Key'], trialStart - .5,
+                                  liftTime + .5 if lifted else None,
+                                  lift_time if lifted else None)
+                    keyLog.endTrial()
+                if thisExp is not None:
+                    values = [i, trial_label, block.thisTrialN, Signal, lifted,
+                              correctThisTrial, this_stoptime, kd_start_synced]
+                    for header, value in zip(['block', 'trialType', 'trial', 'signal',
+                                              'response', 'correct', 'ssd', 'rt'], values):
+                        thisExp.addData(header, value)
+                    if ssdMethod is not None:
+                        for header, value in ssdMethod.state().items():
+                            thisExp.addData(header, value)
+                    thisExp.nextEntry()
+                self.clock.wait(self.ITI)
+
+        if thisExp is not None:
+            with open(outFiles[0] + '.txt', 'a') as b:
+                b.write(dataTxtHeader)
+                for record in records:
+                    b.write(formatDataTxtLine(*[record[col] for col in dataTxtHeader.split()]))
+            if taskInfo['Columnar output']:
+                sessionStore = SessionStore(outFiles[1] + '_trials.npz', info=thisExp.extraInfo)
+                for record in records:
+                    sessionStore.write(*[record[col] for col in dataTxtHeader.split()])
+                sessionStore.close()
+            if keyLog is not None:
+                keyLog.close()
+            thisExp.close()
+        return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate OSARI sessions without a window')
+    parser.add_argument('--participants', type=int, default=100)
+    parser.add_argument('--param', action='append', default=[],
+                        help='set a dialog parameter, e.g. "Step size (s)=0.05"')
+    parser.add_argument('--out', help='directory to write data_txt/ and data/ output to')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--frame-rate', type=float, default=60.)
+    parser.add_argument('--go-mean', type=float, default=.8)
+    parser.add_argument('--go-sd', type=float, default=.07)
+    parser.add_argument('--ssrt-mean', type=float, default=.22)
+    parser.add_argument('--ssrt-sd', type=float, default=.03)
+    args = parser.parse_args(argv)
+
+    try:
+        more_task_info = setParams(selectDefaults(defaultMoreTaskInfo()), args.param)
+    except KeyError as err:
+        parser.error(err.args[0])
+
+    seedSeq = np.random.SeedSequence(args.seed)
+    records = []
+    t0 = time.perf_counter()
+    for n, childSeed in enumerate(seedSeq.generate_state(args.participants)):
+        participant = HorseRaceParticipant(args.go_mean, args.go_sd, args.ssrt_mean,
+                                           args.ssrt_sd, seed=int(childSeed))
+        session = SimulatedSession(more_task_info, participant, participantID=f'sim{n:04d}',
+                                   outDir=args.out, frameRate=args.frame_rate,
+                                   seed=int(childSeed))
+        records.extend(session.run())
+    duration = time.perf_counter() - t0
+
+    stops = [r for r in records if r['trialType'] == 'testBlocks' and r['signal'] == 1]
+    print(f'{len(records)} trials from {args.participants} participants in {duration:.2f} s '
+          f'({len(records) / duration:.0f} trials/s)')
+    if stops:
+        print(f'p(respond|signal) in test blocks: {np.mean([r["response"] for r in stops]):.3f}')
+        print(f'mean SSD in test blocks: {np.mean([r["ssd"] for r in stops]):.3f} s')
+    print(f'simulated session length: {records[-1]["sessionTime"] / 60:.1f} min')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+#Stop-signal delay (SSD) methods of the 'Method' option. Every method has the same interface:
+#update(correct) is called at the start of each trial with the outcome of the previous trial
+#(see scoreTrial in OSARI_logic.py) and returns the SSD of this trial, and state() returns
+#what is recorded with the trial. 'fixed' reads the SSD from the condition file instead.
+import math
+import numpy as np
+from OSARI_logic import calculateStopTime
+
+ssdMethods = ['staircase', 'fixed', 'weighted', 'interleaved', 'quest']
+
+
+class Staircase:
+    """The fixed-step staircase: up one step after a correct stop, down one step after an incorrect stop"""
+    name = 'staircase'
+
+    def __init__(self, start, lower_ssd, upper_ssd, stepsize):
+        self.ssd = start
+        self.lower_ssd = lower_ssd
+        self.upper_ssd = upper_ssd
+        self.stepsize = stepsize
+
+    def update(self, correct):
+        self.ssd = calculateStopTime(correct, self.ssd, self.lower_ssd, self.upper_ssd, self.stepsize)
+        return self.ssd
+
+    def state(self):
+        return {'ssdEstimate': self.ssd}
+
+
+class WeightedStaircase:
+    """
+    Weighted up/down staircase (Kaernbach, 1991) converging on p(respond|signal) =
+    targetP: the step up after a correct stop is targetP / (1 - targetP) times the
+    step down after an incorrect stop. The step starts at initialStep and is halved
+    at every reversal down to stepsize, so the SSD gets close to the target quickly.
+    """
+    name = 'weighted'
+
+    def __init__(self, start, lower_ssd, upper_ssd, stepsize, targetP=.5, initialStep=.1):
+        self.ssd = start
+        self.lower_ssd = lower_ssd
+        self.upper_ssd = upper_ssd
+        self.stepsize = stepsize
+        self.targetP = targetP
+        self.step = max(initialStep, stepsize)
+        self.reversals = 0
+        self._direction = 0
+
+    def update(self, correct):
+        if correct == 2:
+            direction = 1
+            change = self.step * self.targetP / (1 - self.targetP)
+        elif correct == 0:
+            direction = -1
+            change = self.step
+        else:
+            return self.ssd  # not a stop trial
+        if self._direction and direction != self._direction:
+            self.reversals += 1
+            self.step = max(self.step / 2, self.stepsize)
+            change = self.step * self.targetP / (1 - self.targetP) if direction == 1 else self.step
+        self._direction = direction
+        self.ssd = min(max(self.ssd + direction * change, self.lower_ssd), self.upper_ssd)
+        return self.ssd
+
+    def state(self):
+        return {'ssdEstimate': self.ssd, 'ssdStep': self.step, 'ssdReversals': self.reversals}
+
+
+class InterleavedStaircases:
+    """
+    Several fixed-step staircases started at different SSDs; every stop trial uses
+    one of them (in a random order that uses each staircase once per cycle). The
+    estimate is the mean SSD of the staircases, which converge from both sides.
+    """
+    name = 'interleaved'
+
+    def __init__(self, starts, lower_ssd, upper_ssd, stepsize, rng=None):
+        self.staircases = [Staircase(start, lower_ssd, upper_ssd, stepsize) for start in starts]
+        self.rng = np.random.default_rng(rng)
+        self._order = []
+        self.current = self._next()
+        self.ssd = self.staircases[self.current].ssd
+
+    def _next(self):
+        if not self._order:
+            self._order = list(self.rng.permutation(len(self.staircases)))
+        return int(self._order.pop())
+
+    def update(self, correct):
+        if correct in (0, 2):
+            # the last stop trial used the current staircase: step it and pick the next one
+            self.staircases[self.current].update(correct)
+            self.current = self._next()
+        self.ssd = self.staircases[self.current].ssd
+        return self.ssd
+
+    def state(self):
+        return {'ssdEstimate': float(np.mean([staircase.ssd for staircase in self.staircases])),
+                'ssdStaircase': self.current}
+
+
+class QuestSSD:
+    """
+    Bayesian (QUEST-style, Watson & Pelli, 1983) estimate of the SSD at which
+    p(respond|signal) = .5. The posterior over that SSD is kept on a grid between
+    the lowest and highest SSD, starting from a normal prior around the start SSD,
+    and is updated after every stop trial with a logistic psychometric function;
+    the next SSD is the posterior mean (rounded to the grid).
+    """
+    name = 'quest'
+
+    def __init__(self, start, lower_ssd, upper_ssd, priorSD=.15, slope=.04, lapse=.02, grain=.005):
+        self.lower_ssd = lower_ssd
+        self.upper_ssd = upper_ssd
+        self.slope = slope
+        self.lapse = lapse
+        self.grain = grain
+        self.grid = np.arange(lower_ssd, upper_ssd + grain / 2, grain)
+        self.logPosterior = -.5 * ((self.grid - start) / priorSD) ** 2
+        self.ssd = self._nextSSD()
+
+    def pRespond(self, ssd):
+        ''' p(respond|signal) at this SSD for every threshold of the grid'''
+        return self.lapse + (1 - 2 * self.lapse) / (1 + np.exp(-(ssd - self.grid) / self.slope))
+
+    def _posterior(self):
+        posterior = np.exp(self.logPosterior - self.logPosterior.max())
+        return posterior / posterior.sum()
+
+    def _nextSSD(self):
+        ssd = self.lower_ssd + round((self.mean - self.lower_ssd) / self.grain) * self.grain
+        return float(min(max(ssd, self.lower_ssd), self.upper_ssd))
+
+    @property
+    def mean(self):
+        return float(np.dot(self._posterior(), self.grid))
+
+    @property
+    def sd(self):
+        posterior = self._posterior()
+        return math.sqrt(max(float(np.dot(posterior, self.grid ** 2)) - self.mean ** 2, 0.))
+
+    def update(self, correct):
+        if correct == 0:  # incorrect stop: responded
+            self.logPosterior += np.log(self.pRespond(self.ssd))
+        elif correct == 2:  # correct stop
+            self.logPosterior += np.log(1 - self.pRespond(self.ssd))
+        else:
+            return self.ssd
+        self.ssd = self._nextSSD()
+        return self.ssd
+
+    def state(self):
+        return {'ssdEstimate': self.mean, 'ssdEstimateSD': self.sd}
+
+
+def makeSSDMethod(more_task_info, taskInfo, seed=None):
+    """
+    The SSD method selected in the Trial Structure dialog (more_task_info[0]['Method']),
+    starting at the start SSD; None for 'fixed' (SSDs from the condition file)
+    """
+    method = more_task_info[0]['Method']
+    start = taskInfo['StopS start pos. (seconds)']
+    lower_ssd = more_task_info[1]['Lowest SSD (s)']
+    upper_ssd = more_task_info[1]['Highest SSD (s)']
+    stepsize = more_task_info[1]['Step size (s)']
+    if method == 'fixed':
+        return None
+    if method == 'staircase':
+        return Staircase(start, lower_ssd, upper_ssd, stepsize)
+    if method == 'weighted':
+        return WeightedStaircase(start, lower_ssd, upper_ssd, stepsize,
+                                 taskInfo['SSD target p(respond)'],
+                                 taskInfo['Weighted initial step (s)'])
+    if method == 'interleaved':
+        return InterleavedStaircases(taskInfo['Interleaved SSD starts (seconds)'],
+                                     lower_ssd, upper_ssd, stepsize, seed)
+    if method == 'quest':
+        return QuestSSD(start, lower_ssd, upper_ssd,
+                        taskInfo['QUEST prior SD (s)'],
+                        taskInfo['QUEST slope (s)'],
+                        taskInfo['QUEST lapse rate'])
+    raise ValueError(f'unknown SSD method: {method} (one of {", ".join(ssdMethods)})')
@@ -0,0 +1,85 @@
+#Registry of the instruction and feedback stimuli: stimuli are only built when they
+#are first needed (or prepared ahead of time, e.g. during the inter-trial interval)
+from collections import OrderedDict
+from psychopy import visual
+from OSARI_trace import NullTracer
+
+
+class StimulusRegistry:
+    """
+    Text and image stimuli indexed by label (e.g. stimuli['pressHold']).
+    Stimuli are described with addText/addImage and built on first use, or ahead
+    of time with prepare(). Dynamic text (e.g. countdown digits and block
+    counters) is laid out once per distinct text and kept, see text().
+    """
+    # number of dynamic texts kept (the least recently used one is dropped first)
+    maxTexts = 64
+
+    def __init__(self, win):
+        self.win = win
+        self._specs = {}
+        self._loaders = {}
+        self._stimuli = {}
+        self._texts = OrderedDict()
+        self.tracer = NullTracer()  # records the building of stimuli (see OSARI_trace.py)
+
+    def addText(self, label, **kwargs):
+        ''' Describe a visual.TextStim (kwargs as for visual.TextStim)'''
+        self._specs[label] = (visual.TextStim, kwargs)
+
+    def addImage(self, label, imageLoader=None, **kwargs):
+        ''' Describe a visual.ImageStim (kwargs as for visual.ImageStim). imageLoader:
+        a function returning the image, called when the stimulus is built'''
+        if imageLoader is not None:
+            self._loaders[label] = imageLoader
+        self._specs[label] = (visual.ImageStim, kwargs)
+
+    def __contains__(self, label):
+        return label in self._specs
+
+    def __getitem__(self, label):
+        stim = self._stimuli.get(label)
+        if stim is None:
+            stimType, kwargs = self._specs[label]
+            with self.tracer.span('build stimulus', cat='stimulus', label=label):
+                if label in self._loaders:
+                    kwargs = dict(kwargs, image=self._loaders[label]())
+                stim = self._stimuli[label] = stimType(self.win, **kwargs)
+        return stim
+
+    def prepare(self, labels):
+        ''' Build the stimuli that have not been built yet and draw them once to the
+        back buffer (which is cleared again), so that text layout and texture
+        upload do not happen when they are first shown. Only call this when the
+        back buffer is not in use, e.g. during the inter-trial interval.'''
+        new = [label for label in labels if label not in self._stimuli]
+        for label in new:
+            self[label].draw()
+        if new:
+            self.win.clearBuffer()
+
+    def text(self, text, pos=(0, 0), height=1, color=(1, 1, 1), units='cm'):
+        ''' Return a TextStim showing a dynamic text. Every distinct text is laid out
+        and rasterized once and its TextStim is kept, so showing a text again (e.g.
+        the next countdown digit) only swaps which TextStim is drawn.'''
+        key = (text, tuple(pos), height, color if isinstance(color, str) else tuple(color), units)
+        stim = self._texts.get(key)
+        if stim is None:
+            with self.tracer.span('layout text', cat='stimulus'):
+                stim = self._texts[key] = visual.TextStim(
+                                self.win,
+                                pos=pos,
+                                height=height,
+                                color=color,
+                                text=text,
+                                units=units
+                                )
+            if len(self._texts) > self.maxTexts:
+                self._texts.popitem(last=False)
+        else:
+            self._texts.move_to_end(key)
+        return stim
+
+    def message(self, text, pos=(0, 0)):
+        ''' Return the TextStim showing a dynamic message (white, see text())'''
+        return self.text(text, pos)
@@ -0,0 +1,271 @@
+"""
+Columnar session output and study-wide merge
+
+Besides the data_txt/.txt and data/.csv files, every session saves its trials as
+a NumPy structured array (data/ID_OSARI_date_trials.npz, see SessionStore). The
+merge builds a single dataset for a whole study from these files (or from the
+data_txt files of sessions that do not have one):
+
+    python OSARI_store.py data data_txt --study study
+
+The study folder holds trials.npy (all trials, with a 'session' column, ordered
+by session) and sessions.npy (one row per session: source file, participant and
+the slice of trials.npy holding its trials). Running the merge again only reads
+the sessions that are new or have changed since (trials.npy is written again
+with the trials of the sessions kept from before). Load the study with loadStudy,
+which memory-maps it, or export it with --parquet (needs pyarrow).
+"""
+
+from __future__ import absolute_import, division
+import argparse
+import atexit
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from OSARI_logic import dataTxtHeader
+
+# One row per trial: the data_txt columns (NaN when there is no SSD or RT) and
+# the index of the block in the session. The text fields are at least as long as
+# below, and longer where the data needs it (see resized), so nothing is truncated.
+trialDtype = np.dtype([
+                ('id', 'U32'),
+                ('block', 'i2'),
+                ('trialType', 'U32'),
+                ('trial', 'i4'),
+                ('signal', 'i1'),
+                ('response', 'i1'),
+                ('correct', 'i1'),
+                ('ssd', 'f8'),
+                ('rt', 'f8'),
+                ('blockIndex', 'i2')
+                ])
+
+# The merged study: trialDtype plus the session index of each trial
+studyTrialDtype = np.dtype(trialDtype.descr + [('session', 'i4')])
+
+sessionDtype = np.dtype([
+                ('session', 'i4'),
+                ('name', 'U128'),
+                ('file', 'U512'),
+                ('size', 'i8'),
+                ('mtime', 'f8'),
+                ('id', 'U32'),
+                ('start', 'i8'),
+                ('stop', 'i8')
+                ])
+
+storeSuffix = '_trials.npz'
+
+
+def resized(dtype, **lengths):
+    """dtype with its text fields made long enough for the given lengths (field=length)"""
+    fields = []
+    for name in dtype.names:
+        fieldType = dtype.fields[name][0]
+        if name in lengths and fieldType.kind == 'U':
+            fieldType = np.dtype(f'U{max(fieldType.itemsize // 4, lengths[name])}')
+        fields.append((name, fieldType))
+    return np.dtype(fields)
+
+
+def textLength(values):
+    """Length of the longest string of a sequence or array (0 if empty)"""
+    if isinstance(values, np.ndarray):
+        return values.dtype.itemsize // 4 if values.dtype.kind == 'U' else 0
+    return max((len(str(value)) for value in values), default=0)
+
+
+def toFloat(value):
+    """SSD and RT values as floats ('NaN' and empty become NaN)"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def toTrials(rows):
+    """Structured trial array from rows of the data_txt columns"""
+    trials = np.zeros(len(rows), dtype=resized(trialDtype, id=textLength([row[0] for row in rows]),
+                                                   trialType=textLength([row[2] for row in rows])))
+    blockIndex = -1
+    lastType = None
+    for n, (participantID, block, trialType, trial, signal, response, correct, ssd, rt) in enumerate(rows):
+        if trialType != lastType:  # every block of a session has its own trialType
+            blockIndex += 1
+            lastType = trialType
+        trials[n] = (participantID, int(block), trialType, int(trial), int(signal), int(response),
+                     int(correct), toFloat(ssd), toFloat(rt), blockIndex)
+    return trials
+
+
+class SessionStore:
+    """
+    Collect the trials of a session and save them as a structured array
+    (trials, see trialDtype) with the session information (info, JSON) in
+    a .npz file. The file is also saved when Python exits (e.g. on escape).
+    """
+    def __init__(self, fileName, info=None):
+        self.fileName = fileName
+        self.info = info or {}
+        self.rows = []
+        self._closed = False
+        atexit.register(self.close)
+
+    def write(self, participantID, block, trialType, trial, signal, response, correct, ssd, rt):
+        ''' Add one trial (same columns as dataTxtHeader)'''
+        self.rows.append((participantID, block, trialType, trial, signal, response, correct, ssd, rt))
+
+    def close(self):
+        ''' Save the trials'''
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        np.savez_compressed(
+                        self.fileName,
+                        trials=toTrials(self.rows),
+                        info=json.dumps(self.info, default=str)
+                        )
+
+
+def readDataTxt(fileName):
+    """Trials of a data_txt file"""
+    with open(fileName) as f:
+        lines = f.read().splitlines()
+    rows = [line.split('\t') for line in lines if line and line + '\n' != dataTxtHeader]
+    return toTrials([row for row in rows if len(row) == 9])
+
+
+def readSession(fileName):
+    """Trials of a session, from its _trials.npz or data_txt file"""
+    if fileName.endswith(storeSuffix):
+        with np.load(fileName) as session:
+            return session['trials']
+    return readDataTxt(fileName)
+
+
+def sessionName(fileName):
+    """Name shared by the output files of a session (ID_OSARI_date)"""
+    name = os.path.basename(fileName)
+    if name.endswith(storeSuffix):
+        return name[:-len(storeSuffix)]
+    return os.path.splitext(name)[0]
+
+
+def findSessions(dataDirs):
+    """
+    Return {session name: file} for the sessions in the data folders, using the
+    _trials.npz file of a session where there is one, otherwise its data_txt file
+    """
+    found = {}
+    for dataDir in dataDirs:
+        for folder, dirs, files in os.walk(dataDir):
+            for name in sorted(files):
+                fileName = os.path.join(folder, name)
+                if name.endswith(storeSuffix):
+                    found[sessionName(fileName)] = fileName
+                elif name.endswith('.txt') and os.path.basename(folder) == 'data_txt':
+                    found.setdefault(sessionName(fileName), fileName)
+    return found
+
+
+def loadStudy(studyDir, mmap=True):
+    """Return the merged (trials, sessions) of a study, memory-mapped by default"""
+    mode = 'r' if mmap else None
+    try:
+        trials = np.load(os.path.join(studyDir, 'trials.npy'), mmap_mode=mode)
+        sessions = np.load(os.path.join(studyDir, 'sessions.npy'))
+    except FileNotFoundError:
+        return np.zeros(0, dtype=studyTrialDtype), np.zeros(0, dtype=sessionDtype)
+    return trials, sessions
+
+
+def mergeStudy(dataDirs, studyDir, processes=None):
+    """
+    Add the sessions in dataDirs that are new (or have changed) to the study in
+    studyDir, reading them in parallel (processes: number of worker processes,
+    default all cores). Only the new sessions are read, but trials.npy is
+    written again as a whole. Returns the number of sessions read.
+    """
+    os.makedirs(studyDir, exist_ok=True)
+    oldTrials, oldSessions = loadStudy(studyDir)
+    known = {session['name']: session for session in oldSessions}
+    found = findSessions(dataDirs)
+    current = {}
+    for name, fileName in found.items():
+        stat = os.stat(fileName)
+        current[name] = (os.path.abspath(fileName), stat.st_size, stat.st_mtime)
+    keep = [name for name in sorted(known) if name in current
+            and (known[name]['file'], known[name]['size'], known[name]['mtime']) == current[name]]
+    new = sorted(name for name in current if name not in keep)
+    if not new and len(keep) == len(oldSessions):
+        return 0
+
+    with ProcessPoolExecutor(processes) as pool:
+        newTrials = list(pool.map(readSession, [current[name][0] for name in new], chunksize=16))
+
+    # write the new study next to the old one, then swap them over
+    lengths = [known[name]['stop'] - known[name]['start'] for name in keep] + [len(t) for t in newTrials]
+    # long enough text fields for every session (IDs longer than the default are not truncated)
+    allTrials = [oldTrials] + newTrials
+    trialType = resized(studyTrialDtype, id=max(textLength(t['id']) for t in allTrials),
+                        trialType=max(textLength(t['trialType']) for t in allTrials))
+    sessionType = resized(sessionDtype, name=textLength(keep + new),
+                          file=textLength([current[name][0] for name in keep + new]),
+                          id=trialType['id'].itemsize // 4)
+    sessions = np.zeros(len(lengths), dtype=sessionType)
+    tmp = os.path.join(studyDir, f'trials.{os.getpid()}.tmp.npy')
+    trials = np.lib.format.open_memmap(tmp, mode='w+', dtype=trialType, shape=(int(sum(lengths)),))
+    start = 0
+    session = None
+    for n, name in enumerate(keep + new):
+        if n < len(keep):
+            session = oldTrials[known[name]['start']:known[name]['stop']]
+        else:
+            session = newTrials[n - len(keep)]
+        stop = start + len(session)
+        for field in trialDtype.names:
+            trials[field][start:stop] = session[field]
+        trials['session'][start:stop] = n
+        participantID = session['id'][0] if len(session) else ''
+        sessions[n] = (n, name, *current[name], participantID, start, stop)
+        start = stop
+    trials.flush()
+    del trials, session, oldTrials, allTrials  # close the memory maps before replacing the file
+    os.replace(tmp, os.path.join(studyDir, 'trials.npy'))
+    np.save(os.path.join(studyDir, 'sessions.npy'), sessions)
+    return len(new)
+
+
+def exportParquet(studyDir, fileName):
+    """Write the merged trials of a study to a Parquet file (needs pyarrow)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    trials, sessions = loadStudy(studyDir)
+    table = pa.table({field: np.asarray(trials[field]) for field in studyTrialDtype.names})
+    pq.write_table(table, fileName)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Merge OSARI sessions into one study dataset')
+    parser.add_argument('dataDirs', nargs='*', default=['data', 'data_txt'])
+    parser.add_argument('--study', default='study', help='folder of the merged dataset')
+    parser.add_argument('--processes', type=int, help='worker processes (default: all cores)')
+    parser.add_argument('--parquet', help='also export the merged trials to this Parquet file')
+    args = parser.parse_args(argv)
+
+    added = mergeStudy(args.dataDirs, args.study, args.processes)
+    trials, sessions = loadStudy(args.study)
+    print(f'read {added} new or changed sessions; {len(sessions)} sessions, '
+          f'{len(trials)} trials in {args.study}')
+    if args.parquet:
+        try:
+            exportParquet(args.study, args.parquet)
+        except ImportError:
+            parser.error('--parquet needs pyarrow (pip install pyarrow)')
+        print(f'saved {args.parquet}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+#Running performance summary of a block, updated in constant time per trial, so that
+#the experimenter can spot non-compliant participants during the session
+import math
+
+
+class RunningStats:
+    """Running mean and variance (Welford's algorithm)"""
+    def __init__(self):
+        self.n = 0
+        self._mean = 0.
+        self._m2 = 0.
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self._mean
+        self._mean += delta / self.n
+        self._m2 += delta * (x - self._mean)
+
+    @property
+    def mean(self):
+        return self._mean if self.n else math.nan
+
+    @property
+    def sd(self):
+        return math.sqrt(self._m2 / (self.n - 1)) if self.n > 1 else math.nan
+
+
+class P2Quantile:
+    """
+    Running estimate of the p quantile without storing the observations
+    (the P-square algorithm, Jain & Chlamtac, 1985)
+    """
+    def __init__(self, p):
+        self.p = p
+        self.q = []  # marker heights
+        self._n = [0, 1, 2, 3, 4]  # marker positions
+        self._desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self._increment = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        q = self.q
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        n = self._n
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increment[i]
+        for i in range(1, 4):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qi = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                                (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                                (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < qi < q[i + 1]:
+                    qi = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qi
+                n[i] += d
+
+    @property
+    def value(self):
+        if not self.q:
+            return math.nan
+        if len(self.q) < 5:
+            return self.q[min(int(self.p * len(self.q)), len(self.q) - 1)]
+        return self.q[2]
+
+
+class BlockSummary:
+    """
+    Performance over the trials added so far: go RT mean, SD and quantiles, go
+    omissions, p(respond|signal), mean SSD and the SSRT (mean method: mean go RT
+    minus mean SSD). Every statistic is updated in constant time per trial.
+    """
+    quantiles = (.1, .5, .9)
+
+    def __init__(self):
+        self.goRT = RunningStats()
+        self.goRTQuantiles = [P2Quantile(p) for p in self.quantiles]
+        self.goTrials = 0
+        self.omissions = 0
+        self.stopTrials = 0
+        self.stopResponses = 0
+        self.ssd = RunningStats()
+
+    def addTrial(self, signal, lifted, ssd, rt):
+        ''' Add one trial (rt: lift time relative to the start of the trial, 'NaN' if no lift)'''
+        if signal == 1:
+            self.stopTrials += 1
+            self.stopResponses += lifted
+            self.ssd.add(ssd)
+        elif lifted:
+            self.goTrials += 1
+            self.goRT.add(rt)
+            for quantile in self.goRTQuantiles:
+                quantile.add(rt)
+        else:
+            self.goTrials += 1
+            self.omissions += 1
+
+    @property
+    def pOmission(self):
+        return self.omissions / self.goTrials if self.goTrials else math.nan
+
+    @property
+    def pRespond(self):
+        return self.stopResponses / self.stopTrials if self.stopTrials else math.nan
+
+    @property
+    def ssrt(self):
+        if not (self.goRT.n and self.ssd.n):
+            return math.nan
+        return self.goRT.mean - self.ssd.mean
+
+    def text(self):
+        ''' Summary for the experimenter (block complete screen)'''
+        quantiles = ' / '.join(f'{1000 * q.value:.0f}' for q in self.goRTQuantiles)
+        return (f'Go RT: {1000 * self.goRT.mean:.0f} ms (SD {1000 * self.goRT.sd:.0f}), '
+                f'10/50/90%: {quantiles} ms, omissions: {100 * self.pOmission:.0f}%\n'
+                f'p(respond|signal): {self.pRespond:.2f}, mean SSD: {1000 * self.ssd.mean:.0f} ms, '
+                f'SSRT: {1000 * self.ssrt:.0f} ms')
+
+    def logLine(self):
+        ''' Summary on one line (log file)'''
+        return (f'goTrials={self.goTrials} goRTMean={self.goRT.mean:.4f} goRTSD={self.goRT.sd:.4f} '
+                + ' '.join(f'goRTP{100 * q.p:.0f}={q.value:.4f}' for q in self.goRTQuantiles)
+                + f' pOmission={self.pOmission:.3f} stopTrials={self.stopTrials}'
+                f' pRespond={self.pRespond:.3f} meanSSD={self.ssd.mean:.4f} ssrt={self.ssrt:.4f}')
@@ -0,0 +1,198 @@
+"""
+Parameter sweep of the OSARI SSD staircase
+
+Simulates every combination of a grid of settings over a population of virtual
+participants (see simulatePopulation in OSARI_population.py) and tabulates the
+bias and spread of the estimated SSRT (integration method, as in OSARI_analysis.py)
+against the length of the test phase, to choose the settings of a new study, e.g.:
+
+    python OSARI_sweep.py --grid "Step size (s)=[0.025, 0.05]" --grid "Stop proportion=[0.25, 0.33]"
+                          --grid "Number of Test Mixed Blocks=[2, 3, 4]" --out sweep.csv
+
+The grid can set 'Step size (s)', 'Lowest SSD (s)', 'Highest SSD (s)', 'Number of
+Test Mixed Blocks' and 'Stop proportion' (proportion of stop trials in a test
+block, replacing the Signal column of testBlocks.xlsx). Configurations are
+simulated in a process pool and the result of every configuration is kept on disk
+(.cache/sweep), so extending the grid only simulates the new configurations.
+"""
+
+from __future__ import absolute_import, division
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from OSARI_logic import *
+from OSARI_cache import cacheFolder
+from OSARI_population import simulatePopulation
+from OSARI_schedule import jitters, blockCompleteWait
+
+_thisDir = os.path.dirname(os.path.abspath(__file__))
+
+# increase to invalidate the cached results after changing the simulation
+sweepVersion = 1
+
+sweepParameters = ['Step size (s)', 'Lowest SSD (s)', 'Highest SSD (s)',
+                   'Number of Test Mixed Blocks', 'Stop proportion']
+
+resultColumns = ['participants', 'trials', 'stopTrials', 'testMinutes', 'pRespond',
+                 'pRespondOK', 'ssrtBias', 'ssrtSD', 'ssrtRMSE', 'ssdError']
+
+
+def makeGrid(grid):
+    """All combinations of a grid ({parameter: list of values}) as a list of dicts"""
+    for key in grid:
+        if key not in sweepParameters:
+            raise KeyError(f'cannot sweep {key} (one of {", ".join(sweepParameters)})')
+    keys = list(grid)
+    values = [value if isinstance(value, (list, tuple)) else [value] for value in grid.values()]
+    return [dict(zip(keys, combination)) for combination in itertools.product(*values)]
+
+
+def stopSignals(blockSignals, stopProportion):
+    """Signal column of a test block with the same number of trials and the given proportion of stop trials"""
+    nStop = int(round(stopProportion * len(blockSignals)))
+    return [1] * nStop + [0] * (len(blockSignals) - nStop)
+
+
+def integrationSSRT(ssd, respond, goRT):
+    """
+    SSRT of every participant (rows) by the integration method with replacement
+    of go omissions by the slowest go RT (see estimateSSRT in OSARI_analysis.py)
+    """
+    slowest = np.nanmax(goRT, axis=1, keepdims=True)
+    allRT = np.sort(np.where(np.isnan(goRT), slowest, goRT), axis=1)
+    pRespond = respond.mean(axis=1)
+    nth = np.maximum(np.ceil(pRespond * allRT.shape[1]).astype(np.intp) - 1, 0)
+    return np.take_along_axis(allRT, nth[:, None], axis=1)[:, 0] - ssd.mean(axis=1)
+
+
+def cellKey(cell, settings):
+    """Hash of a configuration and the simulation settings (the name of its cached result)"""
+    return hashlib.sha1(json.dumps([sweepVersion, cell, settings], sort_keys=True).encode()).hexdigest()
+
+
+def simulateCell(cell, settings):
+    """Simulate one configuration; returns a result row (the cell and resultColumns)"""
+    more_task_info = updateInfo(selectDefaults(defaultMoreTaskInfo()),
+                                {key: value for key, value in cell.items() if key != 'Stop proportion'})
+    taskInfo = makeTaskInfo(more_task_info)
+    trial_length = taskInfo['trial length (max trial duration in seconds)']
+    blockSignals = settings['blockSignals']
+    if 'Stop proportion' in cell:
+        blockSignals = stopSignals(blockSignals, cell['Stop proportion'])
+    nReps = more_task_info[1]['Number of Test Mixed Blocks']
+    results = simulatePopulation(
+                    blockSignals,
+                    nReps=nReps,
+                    nParticipants=settings['participants'],
+                    startSSD=taskInfo['StopS start pos. (seconds)'],
+                    lower_ssd=more_task_info[1]['Lowest SSD (s)'],
+                    upper_ssd=more_task_info[1]['Highest SSD (s)'],
+                    stepsize=more_task_info[1]['Step size (s)'],
+                    trial_length=trial_length,
+                    goMean=settings['goMean'], goSD=settings['goSD'],
+                    ssrtMean=settings['ssrtMean'], ssrtSD=settings['ssrtSD'],
+                    keepGoRT=True, seed=settings['seed']
+                    )
+    ssrtError = integrationSSRT(results['ssd'], results['respond'], results['goRT']) - results['ssrt']
+    nTrials = len(blockSignals) * nReps
+    # timed length of the test mixed blocks (mean jitter, see OSARI_schedule.py)
+    testSeconds = nTrials * (jitters.mean() + trial_length + settings['ITI']) + blockCompleteWait * (nReps - 1)
+    pRespond = results['pRespond']
+    row = dict(cell)
+    row.update(participants=settings['participants'],
+               trials=nTrials,
+               stopTrials=results['ssd'].shape[1],
+               testMinutes=float(testSeconds / 60),
+               pRespond=float(pRespond.mean()),
+               pRespondOK=float(np.mean((pRespond >= .25) & (pRespond <= .75))),
+               ssrtBias=float(np.nanmean(ssrtError)),
+               ssrtSD=float(np.nanstd(ssrtError)),
+               ssrtRMSE=float(np.sqrt(np.nanmean(ssrtError ** 2))),
+               ssdError=float(np.mean(results['meanSSD'] - results['trueSSD'])))
+    return row
+
+
+def _simulateCell(args):
+    return simulateCell(*args)
+
+
+def sweep(grid, settings, cacheDir=os.path.join(_thisDir, cacheFolder, 'sweep'), processes=None):
+    """
+    Result rows of every configuration of the grid (in grid order), from the cache
+    where a configuration has been simulated before with the same settings
+    """
+    cells = makeGrid(grid)
+    os.makedirs(cacheDir, exist_ok=True)
+    rows = [None] * len(cells)
+    jobs = {}
+    for n, cell in enumerate(cells):
+        cached = os.path.join(cacheDir, cellKey(cell, settings) + '.json')
+        try:
+            with open(cached) as f:
+                rows[n] = json.load(f)
+        except (OSError, ValueError):
+            jobs[n] = cached
+    if jobs:
+        with ProcessPoolExecutor(processes) as pool:
+            futures = {pool.submit(_simulateCell, (cells[n], settings)): n for n in jobs}
+            for future in as_completed(futures):
+                n = futures[future]
+                rows[n] = future.result()
+                # keep every result as soon as it is done, so an interrupted sweep can be resumed
+                tmp = f'{jobs[n]}.{os.getpid()}.tmp'
+                with open(tmp, 'w') as f:
+                    json.dump(rows[n], f)
+                os.replace(tmp, jobs[n])
+    return rows, len(jobs)
+
+
+def saveResults(rows, grid, fileName):
+    """Write the result rows to a .csv file"""
+    with open(fileName, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(grid) + resultColumns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    from OSARI_simulation import importConditions
+    parser = argparse.ArgumentParser(description='Sweep the OSARI staircase settings over simulated participants')
+    parser.add_argument('--grid', action='append', default=[],
+                        help='values of a parameter, e.g. "Step size (s)=[0.025, 0.05]"')
+    parser.add_argument('--participants', type=int, default=2000, help='simulated participants per configuration')
+    parser.add_argument('--cond-file', default=os.path.join(_thisDir, 'conditionFiles', 'testBlocks.xlsx'))
+    parser.add_argument('--seed', type=int, default=0, help='the same seed is used for every configuration')
+    parser.add_argument('--iti', type=float, default=2., help='inter-trial interval (s)')
+    parser.add_argument('--go-mean', type=float, default=.8)
+    parser.add_argument('--go-sd', type=float, default=.07)
+    parser.add_argument('--ssrt-mean', type=float, default=.22)
+    parser.add_argument('--ssrt-sd', type=float, default=.03)
+    parser.add_argument('--processes', type=int, help='worker processes (default: all cores)')
+    parser.add_argument('--out', default='sweep.csv')
+    args = parser.parse_args(argv)
+
+    grid = parseParams(args.grid)
+    try:
+        makeGrid(grid)
+    except KeyError as err:
+        parser.error(err.args[0])
+    settings = {'blockSignals': [int(thisTrial['Signal']) for thisTrial in importConditions(args.cond_file)],
+                'participants': args.participants, 'seed': args.seed, 'ITI': args.iti,
+                'goMean': args.go_mean, 'goSD': args.go_sd,
+                'ssrtMean': args.ssrt_mean, 'ssrtSD': args.ssrt_sd}
+    rows, simulated = sweep(grid, settings, processes=args.processes)
+    saveResults(rows, grid, args.out)
+    print(f'{len(rows)} configurations ({simulated} simulated, {len(rows) - simulated} cached), saved {args.out}')
+    for row in sorted(rows, key=lambda row: row['testMinutes']):
+        label = ', '.join(f'{key}={row[key]}' for key in grid)
+        print(f'{row["testMinutes"]:5.1f} min  SSRT bias {1000 * row["ssrtBias"]:+6.1f} ms  '
+              f'SD {1000 * row["ssrtSD"]:5.1f} ms  RMSE {1000 * row["ssrtRMSE"]:5.1f} ms  {label}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Resolution-matched cache of the Stimuli images
+
+The instruction images are large JPEGs that are drawn full screen. Rather than
+decoding them at full size on every run and having the GPU scale them,
+cachedImage decodes and resamples an image once to the window size and keeps it
+as a raw RGBA array (.npy, in Stimuli/.cache) that is memory-mapped on later
+runs. Every window size has its own cache file, so a lab that alternates
+between displays keeps both; the files of an image are rebuilt when it changes.
+
+To pre-build the cache for a display run e.g.:
+
+    python OSARI_textures.py Stimuli --size 1440 900
+"""
+
+from __future__ import absolute_import, division
+import argparse
+import glob
+import os
+import numpy as np
+from PIL import Image
+from OSARI_cache import cacheFolder, fileHash
+
+imageTypes = ('.jpeg', '.jpg', '.png', '.bmp', '.tif', '.tiff')
+
+
+def textureFileName(imageFile, size, digest):
+    """Cache file of an image (with the given content hash) resampled to size"""
+    folder, name = os.path.split(os.path.abspath(imageFile))
+    return os.path.join(folder, cacheFolder, f'{name}.{size[0]}x{size[1]}.{digest}.npy')
+
+
+def cachedImage(imageFile, size):
+    """
+    Return the image resampled to size (width, height in pixels) as a PIL image
+    backed by the memory-mapped RGBA cache, ready to be given to visual.ImageStim.
+    (ImageStim uploads PIL images as bytes, whereas numpy arrays are first
+    converted to a float32 copy.)
+    """
+    size = (int(size[0]), int(size[1]))
+    digest = fileHash(imageFile)
+    cached = textureFileName(imageFile, size, digest)
+    try:
+        rgba = np.load(cached, mmap_mode='r')
+    except (OSError, ValueError):
+        rgba = _buildTexture(imageFile, size, digest, cached)
+    return Image.frombuffer('RGBA', size, rgba, 'raw', 'RGBA', 0, 1)
+
+
+def _buildTexture(imageFile, size, digest, cached):
+    """Decode and resample an image and store it in the cache"""
+    with Image.open(imageFile) as im:
+        rgba = np.asarray(im.convert('RGBA').resize(size, Image.LANCZOS))
+    try:
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        # remove versions of this image with older content (at any window size)
+        folder, name = os.path.split(os.path.abspath(imageFile))
+        for old in glob.glob(os.path.join(folder, cacheFolder, f'{name}.*.npy')):
+            if not old.endswith(f'.{digest}.npy'):
+                os.remove(old)
+        tmp = f'{cached}.{os.getpid()}.tmp.npy'
+        np.save(tmp, rgba)
+        os.replace(tmp, cached)
+    except OSError:
+        return rgba  # e.g. a read-only Stimuli folder: use the decoded image as is
+    return np.load(cached, mmap_mode='r')
+
+
+def warmTextures(stimDir, size):
+    """Build (if needed) the cache of every image in a folder for a window size"""
+    warmed = []
+    for name in sorted(os.listdir(stimDir)):
+        if name.lower().endswith(imageTypes):
+            imageFile = os.path.join(stimDir, name)
+            cachedImage(imageFile, size)
+            warmed.append(imageFile)
+    return warmed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pre-build the OSARI image cache for a window size')
+    parser.add_argument('stimDir', nargs='?', default='Stimuli')
+    parser.add_argument('--size', type=int, nargs=2, default=[1440, 900],
+                        metavar=('WIDTH', 'HEIGHT'), help='window size in pixels')
+    args = parser.parse_args()
+    for imageFile in warmTextures(args.stimDir, args.size):
+        print(f'cached {imageFile} at {args.size[0]}x{args.size[1]}')
@@ -0,0 +1,163 @@
+#Frame-timing quality of the fill phase of each trial, and prediction of flip times
+from collections import deque
+import numpy as np
+
+# Frames longer than droppedFrameRatio x the refresh period count as dropped
+droppedFrameRatio = 1.5
+
+
+def frameIntervalStats(intervals, framePeriod):
+    """
+    Summarise the frame intervals (in seconds) recorded during one fill phase.
+    returns a dict with the mean, max and 99th percentile interval (in ms) and the
+    number of frames longer than droppedFrameRatio x framePeriod
+    """
+    intervals = np.asarray(intervals, dtype=float)
+    if not len(intervals):
+        return {'frameN': 0, 'frameMean (ms)': 'NaN', 'frameMax (ms)': 'NaN',
+                'frameP99 (ms)': 'NaN', 'droppedFrames': 0}
+    return {'frameN': len(intervals),
+            'frameMean (ms)': float(round(1000 * intervals.mean(), 3)),
+            'frameMax (ms)': float(round(1000 * intervals.max(), 3)),
+            'frameP99 (ms)': float(round(1000 * np.percentile(intervals, 99), 3)),
+            'droppedFrames': int(np.sum(intervals > droppedFrameRatio * framePeriod))}
+
+
+def flipPredictionStats(flips, framePeriod):
+    """
+    Summarise the predicted and actual flip times (seconds, rows of (predicted, actual))
+    of one fill phase. returns a dict with the mean and max absolute error (in ms) and
+    the number of flips more than half a refresh period away from the prediction
+    """
+    flips = np.asarray(flips, dtype=float).reshape(-1, 2)
+    if not len(flips):
+        return {'flipErrorMean (ms)': 'NaN', 'flipErrorMax (ms)': 'NaN', 'flipMispredicted': 0}
+    error = np.abs(flips[:, 1] - flips[:, 0])
+    return {'flipErrorMean (ms)': float(round(1000 * error.mean(), 3)),
+            'flipErrorMax (ms)': float(round(1000 * error.max(), 3)),
+            'flipMispredicted': int(np.sum(error > framePeriod / 2))}
+
+
+class FlipPredictor:
+    """
+    Predict when the frame being drawn will be shown, so the bar can be drawn at
+    its height for that moment rather than for the time it was computed.
+    The next flip is the first refresh after now (plus renderTime) on the grid of
+    the last flip and the refresh period, which starts as the measured period of
+    the window and follows the median of the recent single-frame intervals.
+    Every prediction is kept with the actual time of the flip that followed it
+    (see takeFlips). Times are in the clock of win.flip() (core.monotonicClock).
+    """
+    def __init__(self, framePeriod, history=30, renderTime=0.):
+        self.framePeriod = framePeriod
+        self.period = framePeriod
+        self.renderTime = renderTime
+        self._intervals = deque(maxlen=history)
+        self._lastFlip = None
+        self._pending = None
+        self._flips = []  # (predicted, actual)
+
+    def start(self, flipTime):
+        ''' Start predicting from this flip (the first flip of the fill)'''
+        self._lastFlip = flipTime
+        self._pending = None
+        self._flips = []
+
+    def predict(self, now):
+        ''' Time of the flip that will show the frame drawn from now'''
+        frames = max(np.floor((now + self.renderTime - self._lastFlip) / self.period) + 1, 1)
+        self._pending = self._lastFlip + frames * self.period
+        return self._pending
+
+    def addFlip(self, flipTime):
+        ''' Record the time of a flip (and the prediction for it, if there was one)'''
+        interval = flipTime - self._lastFlip
+        frames = round(interval / self.period)
+        if frames == 1:
+            self._intervals.append(interval)
+            self.period = float(np.median(self._intervals))
+        self._lastFlip = flipTime
+        if self._pending is not None:
+            self._flips.append((self._pending, flipTime))
+            self._pending = None
+
+    def takeFlips(self):
+        ''' The (predicted, actual) flip times recorded since start'''
+        flips = np.array(self._flips, dtype=np.float64).reshape(-1, 2)
+        self._flips = []
+        return flips
+
+
+class FrameTimingLog:
+    """
+    Collect the frame intervals of every trial of a session, so they can be saved
+    to a sidecar .npz file and summarised at the end of the session.
+    """
+    def __init__(self, framePeriod):
+        self.framePeriod = framePeriod
+        self.intervals = []
+        self.trials = []  # (blockIndex, blockName, repN, trialN, stats)
+        self.flips = []  # (predicted, actual) flip times of every trial (see FlipPredictor)
+
+    def addTrial(self, blockIndex, blockName, repN, trialN, intervals, flips=None):
+        ''' Store the frame intervals (and predicted and actual flip times) of one trial
+        and return their summary statistics (no intervals: a trial restored from a
+        checkpoint, whose frames were not recorded)'''
+        intervals = np.asarray(intervals, dtype=np.float32)
+        stats = frameIntervalStats(intervals, self.framePeriod)
+        self.intervals.append(intervals)
+        if flips is not None:
+            stats.update(flipPredictionStats(flips, self.framePeriod))
+        self.flips.append(np.asarray([] if flips is None else flips, dtype=np.float64).reshape(-1, 2))
+        self.trials.append((blockIndex, blockName, repN, trialN, stats))
+        return stats
+
+    def save(self, fileName):
+        ''' Save the raw intervals of the whole session as a compressed .npz file.
+        The intervals of trial n are intervals[trialStart[n]:trialStart[n + 1]]'''
+        lengths = [len(intervals) for intervals in self.intervals]
+        np.savez_compressed(
+                        fileName,
+                        intervals=np.concatenate(self.intervals) if self.intervals else np.zeros(0, np.float32),
+                        trialStart=np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+                        blockIndex=np.array([trial[0] for trial in self.trials], dtype=np.int16),
+                        blockName=np.array([trial[1] for trial in self.trials], dtype=str),
+                        repN=np.array([trial[2] for trial in self.trials], dtype=np.int16),
+                        trialN=np.array([trial[3] for trial in self.trials], dtype=np.int16),
+                        framePeriod=self.framePeriod,
+                        **self._flipArrays()
+                        )
+
+    def _flipArrays(self):
+        ''' The predicted and actual flip times for save: the flips of trial n are
+        predictedFlips[flipStart[n]:flipStart[n + 1]] (none if flips were not predicted)'''
+        flips = np.concatenate(self.flips) if self.flips else np.zeros((0, 2))
+        if not len(flips):
+            return {}
+        return {'predictedFlips': flips[:, 0],
+                'actualFlips': flips[:, 1],
+                'flipStart': np.concatenate([[0], np.cumsum([len(f) for f in self.flips])]).astype(np.int64)}
+
+    def report(self):
+        ''' Return an end-of-session report listing the trials with dropped frames'''
+        allIntervals = np.concatenate(self.intervals) if self.intervals else np.zeros(0)
+        stats = frameIntervalStats(allIntervals, self.framePeriod)
+        dropped = [trial for trial in self.trials if trial[4]['droppedFrames']]
+        restored = sum(not len(intervals) for intervals in self.intervals)
+        lines = [f'Frame timing report (refresh period {1000 * self.framePeriod:.3f} ms, '
+                 f'dropped = longer than {droppedFrameRatio} x refresh period)',
+                 f'{len(self.trials)} trials, {stats["frameN"]} frames during the fill'
+                 + (f' ({restored} trials restored from a checkpoint, without frames)' if restored else ''),
+                 f'mean {stats["frameMean (ms)"]} ms, max {stats["frameMax (ms)"]} ms, '
+                 f'p99 {stats["frameP99 (ms)"]} ms',
+                 f'{stats["droppedFrames"]} dropped frames in {len(dropped)} trials']
+        flips = np.concatenate(self.flips) if self.flips else np.zeros((0, 2))
+        if len(flips):
+            flipStats = flipPredictionStats(flips, self.framePeriod)
+            lines.append(f'flip prediction error: mean {flipStats["flipErrorMean (ms)"]} ms, '
+                         f'max {flipStats["flipErrorMax (ms)"]} ms, '
+                         f'{flipStats["flipMispredicted"]} flips off by more than half a refresh period')
+        for blockIndex, blockName, repN, trialN, trialStats in dropped:
+            lines.append(f'    block {blockIndex} ({blockName}) rep {repN} trial {trialN}: '
+                         f'{trialStats["droppedFrames"]} dropped, max {trialStats["frameMax (ms)"]} ms')
+        return '\n'.join(lines) + '\n'
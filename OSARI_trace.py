@@ -0,0 +1,109 @@
+#Phase-level tracing of a session in Chrome trace format (open the _trace.json file
+#in chrome://tracing or https://ui.perfetto.dev). Tracing is off by default; the
+#NullTracer has the same methods and does nothing.
+import atexit
+import contextlib
+import json
+import os
+import threading
+import time
+
+
+class Tracer:
+    """
+    Record the begin and end of the phases of a session (block, trial, pressHold,
+    fill, ITI...) and every flip of a window, and save them as a Chrome trace.
+    Phases are nested: begin() opens a phase and end() closes the last one opened,
+    or use "with tracer.span(name):".
+    """
+    def __init__(self, fileName, **metadata):
+        self.fileName = fileName
+        self.metadata = metadata
+        self.events = []
+        self._pid = os.getpid()
+        self._open = []
+        self._saved = False
+        atexit.register(self.save)
+
+    def _now(self):
+        return time.perf_counter() * 1e6  # monotonic, in microseconds
+
+    def begin(self, name, cat='phase', **args):
+        ''' Open a phase (args are shown with the phase in the trace viewer)'''
+        self._open.append(name)
+        self.events.append({'name': name, 'cat': cat, 'ph': 'B', 'ts': self._now(),
+                            'pid': self._pid, 'tid': threading.get_ident(), 'args': args})
+
+    def end(self, **args):
+        ''' Close the phase that was opened last'''
+        if not self._open:
+            return
+        self.events.append({'name': self._open.pop(), 'ph': 'E', 'ts': self._now(),
+                            'pid': self._pid, 'tid': threading.get_ident(), 'args': args})
+
+    @contextlib.contextmanager
+    def span(self, name, cat='phase', **args):
+        self.begin(name, cat, **args)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def instant(self, name, cat='event', **args):
+        ''' Mark a moment (e.g. the lift being detected)'''
+        self.events.append({'name': name, 'cat': cat, 'ph': 'i', 's': 't', 'ts': self._now(),
+                            'pid': self._pid, 'tid': threading.get_ident(), 'args': args})
+
+    def traceFlips(self, win):
+        ''' Record every flip of the window (the time spent waiting for the refresh)'''
+        flip = win.flip
+
+        def tracedFlip(*args, **kwargs):
+            start = self._now()
+            flipTime = flip(*args, **kwargs)
+            self.events.append({'name': 'flip', 'cat': 'flip', 'ph': 'X', 'ts': start,
+                                'dur': self._now() - start, 'pid': self._pid,
+                                'tid': threading.get_ident()})
+            return flipTime
+        win.flip = tracedFlip
+
+    def stopTracingFlips(self, win):
+        ''' Stop recording the flips of the window'''
+        vars(win).pop('flip', None)
+
+    def save(self):
+        ''' Close any open phases and write the trace'''
+        if self._saved:
+            return
+        while self._open:
+            self.end()
+        self._saved = True
+        atexit.unregister(self.save)
+        with open(self.fileName, 'w') as f:
+            json.dump({'traceEvents': self.events,
+                       'displayTimeUnit': 'ms',
+                       'otherData': self.metadata}, f, default=str)
+
+
+class NullTracer:
+    """A Tracer that records nothing"""
+    def begin(self, name, cat='phase', **args):
+        pass
+
+    def end(self, **args):
+        pass
+
+    def span(self, name, cat='phase', **args):
+        return contextlib.nullcontext()
+
+    def instant(self, name, cat='event', **args):
+        pass
+
+    def traceFlips(self, win):
+        pass
+
+    def stopTracingFlips(self, win):
+        pass
+
+    def save(self):
+        pass
@@ -0,0 +1,113 @@
+#Background writer for the data_txt output, so that no file is opened or written
+#between the feedback flip and the inter-trial interval
+import atexit
+import os
+import queue
+import threading
+from OSARI_logic import dataTxtHeader, formatDataTxtLine
+
+
+class TrialWriter:
+    """
+    Queue data_txt lines in memory and write them to file in batches from a
+    background thread.
+    flush() blocks until everything queued so far is on disk (flushed and fsynced);
+    call it at block boundaries. The writer is also flushed and closed when Python
+    exits (core.quit() ends with sys.exit), so an escape keeps all trials written.
+    If writing fails (e.g. the disk is full), the error is raised by the next
+    flush() and by close().
+    """
+    def __init__(self, fileName, header=dataTxtHeader, batchSize=50):
+        self.fileName = fileName
+        self.batchSize = batchSize
+        self._queue = queue.Queue()
+        self._file = open(fileName, 'a')
+        self._closed = False
+        self._error = None  # exception raised by the writer thread
+        self._thread = threading.Thread(target=self._run, name='TrialWriter', daemon=True)
+        self._thread.start()
+        if header:
+            self._queue.put(header)
+        atexit.register(self.close)
+
+    def write(self, participantID, block, trialType, trial, signal, response, correct, ssd, rt):
+        ''' Queue one trial (same columns as dataTxtHeader)'''
+        self._queue.put((participantID, block, trialType, trial, signal, response, correct, ssd, rt))
+
+    def writeLine(self, line):
+        ''' Queue a line of text (written as it is, ending with a newline)'''
+        self._queue.put(line)
+
+    def flush(self, fsync=True):
+        ''' Wait until all queued trials have been written to disk
+        (raises the error of the writer thread if writing failed)'''
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put((done, fsync))
+        done.wait()
+        self._raiseError()
+
+    def close(self):
+        ''' Flush, stop the background thread and close the file'''
+        if self._closed:
+            return
+        atexit.unregister(self.close)
+        try:
+            self.flush()
+        finally:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+            self._file.close()
+        self._raiseError()
+
+    def _raiseError(self):
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        self._batch = []
+        try:
+            self._write()
+        except Exception as err:
+            # keep the error for flush/close, and answer their requests so they never wait forever
+            self._error = err
+            for item in self._batch:
+                if isinstance(item, tuple) and isinstance(item[0], threading.Event):
+                    item[0].set()
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                if isinstance(item, tuple) and isinstance(item[0], threading.Event):
+                    item[0].set()
+
+    def _write(self):
+        while True:
+            batch = self._batch = [self._queue.get()]
+            while len(batch) < self.batchSize:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for item in batch:
+                if item is None or (isinstance(item, tuple) and isinstance(item[0], threading.Event)):
+                    # write what we have so far before handling a flush or stop request
+                    self._file.write(''.join(lines))
+                    lines = []
+                    if item is None:
+                        self._file.flush()
+                        return
+                    done, fsync = item
+                    self._file.flush()
+                    if fsync:
+                        os.fsync(self._file.fileno())
+                    done.set()
+                elif isinstance(item, str):
+                    lines.append(item)
+                else:
+                    lines.append(formatDataTxtLine(*item))
+            if lines:
+                self._file.write(''.join(lines))
@@ -0,0 +1,5 @@
+# The OSARI modules live in the task folder, next to this one
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
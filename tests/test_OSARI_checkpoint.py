@@ -0,0 +1,82 @@
+"""Session checkpoint and resuming (OSARI_checkpoint.py)"""
+import os
+from OSARI_checkpoint import Checkpoint, checkpointSuffix, findCheckpoint, readCheckpoint, setAsideOutputs
+from OSARI_ssd import Staircase
+
+expInfo = {'Participant ID': 'P1', 'date': '2026-10-18_10h00'}
+more_task_info = [{'Method': 'staircase'}, {'Step size (s)': .05}]
+
+
+def addTrials(checkpoint, first, outcomes):
+    for n, correct in enumerate(outcomes, first):
+        checkpoint.addTrial(n, 3, 0, n, .2, ['P1', 1, 'testBlocks', n, 1, 0, correct, .2, 'NaN'], {'correct': correct})
+
+
+def makeCheckpoint(tmp_path, outcomes):
+    fileName = str(tmp_path / ('P1_OSARI_x' + checkpointSuffix))
+    checkpoint = Checkpoint(fileName, expInfo, more_task_info, 1234, 10)
+    addTrials(checkpoint, 0, outcomes)
+    checkpoint.sync()
+    return fileName, checkpoint
+
+
+def test_round_trip(tmp_path):
+    fileName, checkpoint = makeCheckpoint(tmp_path, [2, 0, 2])
+    session, trials, finished = readCheckpoint(fileName)
+    assert session['expInfo'] == expInfo
+    assert session['more_task_info'] == more_task_info
+    assert session['seed'] == 1234 and session['nTrials'] == 10
+    assert [trial['trial'] for trial in trials] == [0, 1, 2]
+    assert trials[1]['row'] == {'correct': 0}
+    assert not finished
+    checkpoint.close()
+    assert readCheckpoint(fileName)[2]
+
+
+def test_replay_restores_the_staircase(tmp_path):
+    outcomes = [2, 2, 0, 2]
+    fileName, checkpoint = makeCheckpoint(tmp_path, outcomes)
+    checkpoint.close(finished=False)
+    # the outcomes of the restored trials take the staircase to the same SSD
+    live = Staircase(.2, .05, .75, .05)
+    for correct in outcomes:
+        live.update(correct)
+    replayed = Staircase(.2, .05, .75, .05)
+    for trial in readCheckpoint(fileName)[1]:
+        replayed.update(trial['values'][6])
+    assert replayed.ssd == live.ssd
+
+
+def test_resume_drops_a_partial_line_and_later_trials(tmp_path):
+    fileName, checkpoint = makeCheckpoint(tmp_path, [2, 0, 2])
+    checkpoint.close(finished=False)
+    with open(fileName, 'a') as f:
+        f.write('{"type": "trial", "tri')  # crashed whilst writing
+    assert len(readCheckpoint(fileName)[1]) == 3
+    # resumed after trial 1: trial 2 is run again
+    checkpoint = Checkpoint(fileName, resumeFrom=2)
+    addTrials(checkpoint, 2, [0, 2])
+    checkpoint.close()
+    session, trials, finished = readCheckpoint(fileName)
+    assert [trial['trial'] for trial in trials] == [0, 1, 2, 3]
+    assert [trial['values'][6] for trial in trials] == [2, 0, 0, 2]
+    assert finished
+    with open(fileName) as f:
+        assert all(line.endswith('}\n') for line in f)
+
+
+def test_only_interrupted_sessions_are_offered(tmp_path):
+    fileName, checkpoint = makeCheckpoint(tmp_path, [2])
+    assert findCheckpoint(str(tmp_path), 'P1') == fileName
+    assert findCheckpoint(str(tmp_path), 'P2') is None
+    checkpoint.abort()  # the participant chose to end the session
+    assert readCheckpoint(fileName)[2]
+    assert findCheckpoint(str(tmp_path), 'P1') is None
+    assert findCheckpoint(str(tmp_path / 'missing'), 'P1') is None
+
+
+def test_setAsideOutputs(tmp_path):
+    stem = str(tmp_path / 'P1_OSARI_x')
+    open(stem + '.csv', 'w').close()
+    setAsideOutputs(stem)
+    assert os.listdir(str(tmp_path)) == ['P1_OSARI_x_interrupted.csv']
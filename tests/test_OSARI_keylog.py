@@ -0,0 +1,78 @@
+"""Raw key-event log, replay and re-scoring (OSARI_keylog.py)"""
+import numpy as np
+import pytest
+from OSARI_keylog import (KeyEventLog, clockReset, findKeyLogs, keyEvent, keyLogSuffix, readKeyLog,
+                          replayTrials, rescoreStudy)
+from OSARI_store import SessionStore, storeSuffix
+
+# (clock reset, [(key, tDown, duration, detected)]) of four 1 s trials:
+# 0: lift detected at .6; 1: no lift (escape released); 2: lift at .4 missed by the
+# fill loop; 3: lift after the end of the trial
+trials = [(100., [('space', 99.5, 1.1, .6)]),
+          (102., [('space', 101.5, None, None), ('escape', 102.1, .1, None)]),
+          (104., [('space', 103.5, .9, None)]),
+          (106., [('space', 105.5, 1.7, None)])]
+
+
+def writeKeyLog(fileName, trials=trials, startTrial=0):
+    keyLog = KeyEventLog(fileName, startTrial)
+    for reset, keys in trials:
+        keyLog.addReset(reset)
+        for key in keys:
+            keyLog.addKey(*key)
+        keyLog.endTrial()
+        keyLog.flush()
+    keyLog.close()
+
+
+def test_write_and_read(tmp_path):
+    fileName = str(tmp_path / ('P1_OSARI_x' + keyLogSuffix))
+    writeKeyLog(fileName)
+    records = readKeyLog(fileName)
+    assert list(records['trial']) == [0, 0, 1, 1, 1, 2, 2, 3, 3]
+    assert list(records['kind']) == [clockReset, keyEvent] * 2 + [keyEvent] + [clockReset, keyEvent] * 2
+    assert records['key'][1] == b'space'
+    assert np.isnan(records['duration'][3]) and np.isnan(records['detected'][3])
+    # a partly written record at the end is ignored
+    with open(fileName, 'ab') as f:
+        f.write(b'\0' * 7)
+    assert len(readKeyLog(fileName)) == len(records)
+
+
+def test_resume_keeps_the_earlier_trials(tmp_path):
+    fileName = str(tmp_path / ('P1_OSARI_x' + keyLogSuffix))
+    writeKeyLog(fileName)
+    # resumed at trial 2: trials 2 and 3 are run again
+    writeKeyLog(fileName, trials[2:], startTrial=2)
+    assert list(readKeyLog(fileName)['trial']) == [0, 0, 1, 1, 1, 2, 2, 3, 3]
+
+
+def test_replay(tmp_path):
+    fileName = str(tmp_path / ('P1_OSARI_x' + keyLogSuffix))
+    writeKeyLog(fileName)
+    lifted, RT, kd_start_synced = replayTrials(len(trials), readKeyLog(fileName))
+    assert list(lifted) == [1, 0, 1, 0]
+    # detected lift: the detection time; missed lift: the release time
+    assert RT[0] == pytest.approx(.6)
+    assert RT[2] == pytest.approx(.4)
+    assert kd_start_synced[[0, 2]] == pytest.approx([.6, .4])
+    assert np.isnan(RT[[1, 3]]).all() and np.isnan(kd_start_synced[[1, 3]]).all()
+
+
+def test_rescore(tmp_path):
+    stem = str(tmp_path / 'P1_OSARI_x')
+    writeKeyLog(stem + keyLogSuffix)
+    # as recorded: the missed lift of trial 2 was scored as an omission
+    store = SessionStore(stem + storeSuffix)
+    for n, (response, correct, rt) in enumerate([(1, 1, .6), (0, -1, 'NaN'), (0, -1, 'NaN'), (0, -1, 'NaN')]):
+        store.write('P1', 1, 'testGo', n, 0, response, correct, 'NaN', rt)
+    store.close()
+
+    sessions = findKeyLogs([str(tmp_path)])
+    assert sessions == {'P1_OSARI_x': (stem + keyLogSuffix, stem + storeSuffix)}
+    names, rescored = rescoreStudy(sessions)
+    assert names == ['P1_OSARI_x']
+    assert list(rescored['response']) == [1, 0, 1, 0]
+    assert list(rescored['correct']) == [1, -1, 1, -1]
+    assert rescored['rt'][2] == pytest.approx(.4)
+    assert list(rescored['changed']) == [False, False, True, False]
@@ -0,0 +1,118 @@
+"""Updates of the SSD methods (OSARI_ssd.py)"""
+import numpy as np
+import pytest
+from OSARI_ssd import InterleavedStaircases, QuestSSD, Staircase, WeightedStaircase, makeSSDMethod
+
+# scoreTrial outcomes
+omission, incorrectStop, correctGo, correctStop = -1, 0, 1, 2
+
+
+def test_staircase_steps_and_bounds():
+    staircase = Staircase(.2, .1, .3, .05)
+    assert staircase.update(correctStop) == pytest.approx(.25)
+    assert staircase.update(correctGo) == pytest.approx(.25)
+    assert staircase.update(incorrectStop) == pytest.approx(.2)
+
+
+
+def test_staircase_stays_at_the_bounds():
+    # (steps that are exact in binary: the bounds are compared with ==, as in calculateStopTime)
+    staircase = Staircase(.5, .25, .75, .25)
+    assert [staircase.update(correctStop) for _ in range(2)] == [.75, .75]
+    assert [staircase.update(incorrectStop) for _ in range(3)] == [.5, .25, .25]
+
+
+def test_weighted_steps_are_weighted_by_the_target():
+    staircase = WeightedStaircase(.2, 0, 1, .01, targetP=.75, initialStep=.04)
+    # up 3 steps after a correct stop (.75 / .25), down one step after an incorrect stop
+    assert staircase.update(correctStop) == pytest.approx(.32)
+    assert staircase.update(correctStop) == pytest.approx(.44)
+    # go trials do not move the SSD
+    assert staircase.update(correctGo) == pytest.approx(.44)
+    assert staircase.update(omission) == pytest.approx(.44)
+
+
+def test_weighted_halves_the_step_at_reversals():
+    staircase = WeightedStaircase(.2, 0, 1, .01, initialStep=.08)
+    staircase.update(correctStop)  # up .08
+    assert staircase.update(incorrectStop) == pytest.approx(.24)  # reversal: down .04
+    assert staircase.update(correctStop) == pytest.approx(.26)  # reversal: up .02
+    assert staircase.update(incorrectStop) == pytest.approx(.25)  # reversal: down .01 (stepsize)
+    assert staircase.update(correctStop) == pytest.approx(.26)  # the step stays at stepsize
+    assert staircase.reversals == 4
+    assert staircase.state() == {'ssdEstimate': staircase.ssd, 'ssdStep': .01, 'ssdReversals': 4}
+
+
+def test_weighted_stays_within_the_bounds():
+    staircase = WeightedStaircase(.2, .1, .3, .01, initialStep=.5)
+    assert staircase.update(correctStop) == .3
+    assert staircase.update(incorrectStop) == .1
+
+
+def test_interleaved_uses_each_staircase_once_per_cycle():
+    starts = [.1, .2, .3]
+    staircases = InterleavedStaircases(starts, 0, 1, .05, rng=1)
+    used = []
+    for _ in range(2 * len(starts)):
+        used.append(staircases.current)
+        staircases.update(correctStop)
+    assert sorted(used[:3]) == [0, 1, 2]
+    assert sorted(used[3:]) == [0, 1, 2]
+    # each staircase was stepped up twice (only by its own stop trials)
+    assert [staircase.ssd for staircase in staircases.staircases] == pytest.approx([.2, .3, .4])
+
+
+def test_interleaved_go_trials_keep_the_current_staircase():
+    staircases = InterleavedStaircases([.1, .3], 0, 1, .05, rng=2)
+    current = staircases.current
+    assert staircases.update(correctGo) == staircases.staircases[current].ssd
+    assert staircases.current == current
+
+
+def test_interleaved_is_seeded():
+    orders = []
+    for _ in range(2):
+        staircases = InterleavedStaircases([.1, .2, .3, .4], 0, 1, .05, rng=7)
+        order = []
+        for _ in range(8):
+            order.append(staircases.current)
+            staircases.update(correctStop)
+        orders.append(order)
+    assert orders[0] == orders[1]
+
+
+def test_quest_moves_towards_the_outcomes():
+    quest = QuestSSD(.2, 0, .6)
+    start = quest.ssd
+    assert quest.update(correctStop) > start  # stopped: the threshold is later
+    quest = QuestSSD(.2, 0, .6)
+    assert quest.update(incorrectStop) < start  # responded: the threshold is earlier
+    assert quest.update(correctGo) == quest.ssd  # go trials do not change the estimate
+
+
+def test_quest_converges_on_the_threshold():
+    threshold = .3
+    quest = QuestSSD(.2, 0, .6, slope=.02, lapse=0.)
+    rng = np.random.default_rng(3)
+    correct = correctGo
+    for _ in range(200):
+        ssd = quest.update(correct)
+        pRespond = 1 / (1 + np.exp(-(ssd - threshold) / .02))
+        correct = incorrectStop if rng.random() < pRespond else correctStop
+    assert quest.mean == pytest.approx(threshold, abs=.02)
+    assert quest.sd < .02
+    # the SSD is on the grid
+    assert round(quest.ssd / quest.grain, 6) % 1 == 0
+
+
+@pytest.mark.parametrize('method, kind', [('staircase', Staircase), ('weighted', WeightedStaircase),
+                                          ('interleaved', InterleavedStaircases), ('quest', QuestSSD)])
+def test_makeSSDMethod(method, kind):
+    more_task_info = [{'Method': method},
+                      {'Lowest SSD (s)': .05, 'Highest SSD (s)': .75, 'Step size (s)': .025}]
+    taskInfo = {'StopS start pos. (seconds)': .2, 'SSD target p(respond)': .5,
+                'Weighted initial step (s)': .1, 'Interleaved SSD starts (seconds)': [.1, .3],
+                'QUEST prior SD (s)': .15, 'QUEST slope (s)': .04, 'QUEST lapse rate': .02}
+    assert isinstance(makeSSDMethod(more_task_info, taskInfo, seed=1), kind)
+    more_task_info[0]['Method'] = 'fixed'
+    assert makeSSDMethod(more_task_info, taskInfo) is None
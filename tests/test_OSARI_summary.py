@@ -0,0 +1,59 @@
+"""Running block summary (OSARI_summary.py)"""
+import math
+import numpy as np
+import pytest
+from OSARI_summary import BlockSummary, P2Quantile, RunningStats
+
+
+def test_running_stats():
+    values = [.41, .52, .38, .6, .47]
+    stats = RunningStats()
+    assert math.isnan(stats.mean) and math.isnan(stats.sd)
+    for value in values:
+        stats.add(value)
+    assert stats.mean == pytest.approx(np.mean(values))
+    assert stats.sd == pytest.approx(np.std(values, ddof=1))
+
+
+def test_p2_first_observations():
+    quantile = P2Quantile(.5)
+    assert math.isnan(quantile.value)
+    for value in [.3, .1, .2]:
+        quantile.add(value)
+    assert quantile.value == .2
+
+
+@pytest.mark.parametrize('p', [.1, .5, .9])
+@pytest.mark.parametrize('distribution', ['normal', 'lognormal'])
+def test_p2_estimates_the_quantile(p, distribution):
+    rng = np.random.default_rng(4)
+    if distribution == 'normal':
+        values = rng.normal(.5, .05, 5000)
+    else:
+        values = .3 + rng.lognormal(-2, .5, 5000)
+    quantile = P2Quantile(p)
+    for value in values:
+        quantile.add(value)
+    assert quantile.value == pytest.approx(np.quantile(values, p), abs=.005)
+
+
+def test_p2_markers_stay_ordered():
+    quantile = P2Quantile(.9)
+    for value in np.random.default_rng(5).uniform(0, 1, 1000):
+        quantile.add(value)
+        assert quantile.q == sorted(quantile.q)
+
+
+def test_block_summary():
+    summary = BlockSummary()
+    # go trials: two responses and an omission; stop trials: one response, one stop
+    summary.addTrial(0, 1, 'NaN', .8)
+    summary.addTrial(0, 1, 'NaN', .7)
+    summary.addTrial(0, 0, 'NaN', 'NaN')
+    summary.addTrial(1, 1, .2, .75)
+    summary.addTrial(1, 0, .3, 'NaN')
+    assert summary.goRT.mean == pytest.approx(.75)
+    assert summary.pOmission == pytest.approx(1 / 3)
+    assert summary.pRespond == pytest.approx(.5)
+    assert summary.ssrt == pytest.approx(.75 - .25)
+    assert 'SSRT: 500 ms' in summary.text()
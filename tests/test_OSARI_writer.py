@@ -0,0 +1,50 @@
+"""Background data_txt writer (OSARI_writer.py)"""
+import errno
+import os
+import pytest
+import OSARI_writer
+from OSARI_logic import dataTxtHeader, formatDataTxtLine
+from OSARI_writer import TrialWriter
+
+trial = ('P1', 1, 'testGo', 0, 0, 1, 1, 'NaN', .61)
+
+
+def test_write_flush_and_close(tmp_path):
+    fileName = str(tmp_path / 'P1.txt')
+    writer = TrialWriter(fileName, batchSize=2)
+    for n in range(5):
+        writer.write(*trial[:3], n, *trial[4:])
+    writer.flush()
+    with open(fileName) as f:
+        assert f.read() == dataTxtHeader + ''.join(formatDataTxtLine(*trial[:3], n, *trial[4:]) for n in range(5))
+    writer.writeLine('{"type": "end"}\n')
+    writer.close()
+    writer.close()  # closing again does nothing
+    with open(fileName) as f:
+        assert f.read().endswith('{"type": "end"}\n')
+
+
+def test_no_header(tmp_path):
+    fileName = str(tmp_path / 'P1.txt')
+    writer = TrialWriter(fileName, header=None)
+    writer.write(*trial)
+    writer.close()
+    with open(fileName) as f:
+        assert f.read() == formatDataTxtLine(*trial)
+
+
+def test_write_errors_are_raised(tmp_path, monkeypatch):
+    def fsync(fd):
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+    monkeypatch.setattr(OSARI_writer.os, 'fsync', fsync)
+    writer = TrialWriter(str(tmp_path / 'P1.txt'))
+    writer.write(*trial)
+    with pytest.raises(OSError):
+        writer.flush()
+    # the writer thread keeps answering, so later calls raise the same error instead of waiting forever
+    writer.write(*trial)
+    with pytest.raises(OSError):
+        writer.flush(fsync=False)
+    with pytest.raises(OSError):
+        writer.close()
+    assert not writer._thread.is_alive()